@@ -12,18 +12,19 @@ import module.childes_parser as parser
 import module.tokenisation as tokenizer
 import module.annotator as annotator
 import module.custom_panda_saver as ctm_saver
+from module.token_store import TokenStore
+from module.count_matrix import CountMatrix
 from module.tee_logger import start_capture, get_log, save_string_to_file
 
 import time
 
-start_capture() # to save console print to log
-
 doc_path = '/Users/zikfle/Documents/Maitrise-analyse'
 parsed_file_name = 'french_corpa_parsed.csv'
-tokenized_file_name = 'french_corpa_token.csv'
+tokenized_file_name = 'french_corpa_token.parquet' # .parquet keeps the token lists as lists (.csv also works)
 annotated_file_name = 'french_corpa_annotated.csv'
 child_dico_name = 'child_dico.csv'
 over_dico_name = 'over_dico.csv'
+over_levels_name = 'over_dico_levels.csv' # overheard frequencies per corpus, transcript and child environment
 
 data_folder_location = os.path.join(doc_path,'data')
 raw_data_folder_location = os.path.join(doc_path,'data/French-Corpa')
@@ -31,35 +32,82 @@ result_folder_location = os.path.join(doc_path,'results')
 
 parsed_path = os.path.join(doc_path,'results',parsed_file_name)
 token_path = os.path.join(doc_path,'results',tokenized_file_name)
+token_store_path = None # e.g. os.path.join(doc_path,'results','french_corpa_token_store.npz') to also save the flat arrays of the tokens (see token_store.TokenStore)
+count_matrix_path = os.path.join(doc_path,'results','french_corpa_count_matrix.npz') # lemma counts per transcript x participant (see count_matrix.CountMatrix)
+parse_cache_folder = os.path.join(doc_path,'results','parse_cache') # None to always reparse every file
+annotation_cache_folder = os.path.join(doc_path,'results','annotation_cache') # wordnet hyperonym table and lexical values of the lemmas
+participant_registry_path = os.path.join(doc_path,'results','participant_ids.json') # keeps the participant_id stable between runs
 
 parsing = True
 tokenization = True
 annotation = True
 name_of_version = 'version 3'
+jobs = 1 # number of process used for parsing, tokenisation and the lexical diversity (None = one per CPU)
+streaming = False # write the parsed csv transcript by transcript (bounded memory)
+fused = False # tokenise the %mor while parsing, only the token csv is written (parsing and tokenization stages in one)
+diversity_metrics = ['HDD'] # lexical diversity columns of the annotation, among HDD, MTLD, vocd-D, MATTR, TTR
+
+# the guard is needed by the process pool (the workers re-import this script)
+if __name__ == '__main__':
+    start_capture() # to save console print to log
+
+    start_time = time.perf_counter()
 
-start_time = time.perf_counter()
+    if parsing == True and fused == True:
+        # parsing and tokenisation in one stage, without the parsed csv
+        if streaming == True:
+            token_chunks = parser.iter_chat_folder(raw_data_folder_location, jobs=jobs, cache_dir=parse_cache_folder,
+                                                   exclude_corpora=tokenizer.excluded_corpus,
+                                                   registry_path=participant_registry_path, tokenize=True)
+            token_path = ctm_saver.safe_save_chunks(token_chunks,result_folder_location,tokenized_file_name,index=True)
+            count_matrix_path = None # the tokens are not kept in memory, the annotation counts them from the token file
+        else:
+            token_data = parser.parse_chat_folder(raw_data_folder_location, jobs=jobs, cache_dir=parse_cache_folder,
+                                                  exclude_corpora=tokenizer.excluded_corpus,
+                                                  registry_path=participant_registry_path, tokenize=True)
+            token_path = ctm_saver.safe_save(token_data,result_folder_location,tokenized_file_name,index=True)
+            token_store = TokenStore.from_dataframe(token_data)
+            if token_store_path is not None:
+                token_store.save(token_store_path)
+            if token_path is not None:
+                # stamped with the written token file, so the annotation knows it is the same
+                CountMatrix.from_store(token_store, token_data).stamp(token_path).save(count_matrix_path)
 
-if parsing == True:
-    parsed_data = parser.parse_chat_folder(raw_data_folder_location)
-    parsed_path = ctm_saver.safe_save(parsed_data,result_folder_location,parsed_file_name, sep = ",",index=True)
+    elif parsing == True:
+        # the excluded corpus of the tokenisation are not even parsed
+        if streaming == True:
+            parsed_chunks = parser.iter_chat_folder(raw_data_folder_location, jobs=jobs, cache_dir=parse_cache_folder,
+                                                    exclude_corpora=tokenizer.excluded_corpus,
+                                                    registry_path=participant_registry_path)
+            parsed_path = ctm_saver.safe_save_chunks(parsed_chunks,result_folder_location,parsed_file_name, sep = ",",index=True)
+        else:
+            parsed_data = parser.parse_chat_folder(raw_data_folder_location, jobs=jobs, cache_dir=parse_cache_folder,
+                                                   exclude_corpora=tokenizer.excluded_corpus,
+                                                   registry_path=participant_registry_path)
+            parsed_path = ctm_saver.safe_save(parsed_data,result_folder_location,parsed_file_name, sep = ",",index=True)
 
-if tokenization == True:
-    token_data = tokenizer.parse_token(parsed_path)
-    token_path = ctm_saver.safe_save(token_data,result_folder_location,tokenized_file_name,index=True)
+    if tokenization == True and fused == False:
+        token_data = tokenizer.parse_token(parsed_path, store_path=token_store_path, jobs=jobs)
+        token_path = ctm_saver.safe_save(token_data,result_folder_location,tokenized_file_name,index=True)
+        if token_path is not None:
+            CountMatrix.from_dataframe(token_data).stamp(token_path).save(count_matrix_path)
 
-if annotation == True:
-    datafinal, data_dico_final, overheard_dico, param = annotator.annotating(data_folder_location,token_path)
-    annotated_path = ctm_saver.safe_save(datafinal,result_folder_location,annotated_file_name, sep = ",")
-    child_dico_path = ctm_saver.safe_save(data_dico_final,result_folder_location,child_dico_name, sep = ",")
-    over_dico_path = ctm_saver.safe_save(overheard_dico,result_folder_location,over_dico_name, sep = ",")
-    end_time = time.perf_counter()
-    elapsed_time = end_time - start_time
-    print(f"Elapsed time: {elapsed_time:.1f} seconds")
-    log_contents = get_log()
-    log = f"####################\n{name_of_version}\n####################\n\nparam\n"
-    log = log + log_contents
-    save_string_to_file(os.path.join(result_folder_location,f"log{name_of_version}.txt"), log)
+    if annotation == True:
+        datafinal, data_dico_final, overheard_dico, overheard_levels, param = annotator.annotating(data_folder_location,token_path,cache_dir=annotation_cache_folder,jobs=jobs,
+                                                                                                   metrics=diversity_metrics,
+                                                                                                   matrix_path=count_matrix_path)
+        annotated_path = ctm_saver.safe_save(datafinal,result_folder_location,annotated_file_name, sep = ",")
+        child_dico_path = ctm_saver.safe_save(data_dico_final,result_folder_location,child_dico_name, sep = ",")
+        over_dico_path = ctm_saver.safe_save(overheard_dico,result_folder_location,over_dico_name, sep = ",")
+        over_levels_path = ctm_saver.safe_save(overheard_levels,result_folder_location,over_levels_name, sep = ",")
+        end_time = time.perf_counter()
+        elapsed_time = end_time - start_time
+        print(f"Elapsed time: {elapsed_time:.1f} seconds")
+        log_contents = get_log()
+        log = f"####################\n{name_of_version}\n####################\n\nparam\n"
+        log = log + log_contents
+        save_string_to_file(os.path.join(result_folder_location,f"log{name_of_version}.txt"), log)
 
-    print('---------------------------------------------------------')
-    print('Done')
-    print('---------------------------------------------------------')
\ No newline at end of file
+        print('---------------------------------------------------------')
+        print('Done')
+        print('---------------------------------------------------------')
\ No newline at end of file
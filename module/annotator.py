@@ -14,9 +14,16 @@ import os #for file management
 #import json 
 from tqdm import tqdm #for progress bar
 import pandas as pd #for dataframe management
+import numpy as np #for the token arrays
 import math
 import ast #for reading string as list
 import unicodedata #for reading string as unicode
+import hashlib #for the signature of the feature cache
+import pickle #for the feature cache
+
+import module.custom_panda_saver as ctm_saver
+from module.count_matrix import CountMatrix
+from module.lexical_diversity import diversity_of_bags
 
 ### Importing nlp library
 import nltk #for using Wordnet
@@ -29,7 +36,80 @@ from collections import Counter
 # Fonctions
 # ---------------------------------------------------------
 
-def get_hyperval(lemma:str):
+# the nltk_data folders of the Open Multilingual Wordnet read by nltk.corpus.wordnet
+omw_resources = ['corpora/omw-1.4', 'corpora/omw']
+
+def omw_signature(lang:str = 'fra'):
+    """
+    This fonction return a short hash of the OMW data file of a language
+    (the lemmas of build_hyper_table), found with nltk.data.find.
+    If it can not be read, a warning is printed and 'noomw' returned
+    (the hyperonym table is then not rebuilt when the OMW data changes)
+    """
+    for resource in omw_resources:
+        try:
+            with nltk.data.find(f"{resource}/{lang}/wn-data-{lang}.tab").open() as omw_file:
+                data = omw_file.read()
+        except (LookupError, OSError):
+            continue
+        return hashlib.blake2b(resource.encode('utf-8') + data, digest_size=6).hexdigest()
+    print(f'⚠️ No OMW data file for {lang} found in {omw_resources}, '
+          'the hyperonym table will not be rebuilt if the OMW data changes')
+    return 'noomw'
+
+def hyper_table_path(cache_dir:str):
+    """
+    This fonction return the path of the hyperonym table (see load_hyper_table),
+    its name holds the nltk and wordnet versions and the hash of the OMW
+    french data (see omw_signature), so a new wordnet or OMW data gives a new table
+    """
+    version = f"nltk{nltk.__version__}_wn{wordnet.get_version()}_omw{omw_signature('fra')}"
+    return os.path.join(cache_dir, f"wordnet_hyper_fra_{version}.parquet")
+
+def build_hyper_table(lang:str = 'fra'):
+    """
+    This fonction takes every lemma of a wordnet language (OMW)
+    and computes once the hyperonym depth statistics of its synsets
+    (the min_depth of each synset is only computed once)
+
+    parameter
+    ------------
+    lang: the OMW language code
+    return: a DataFrame with a line per lemma (lemma, mean, mode, first, max, n_synsets),
+    mean is the value of get_hyperval and first the depth of the first sense
+    """
+    depths = {}
+    rows = []
+    names = sorted(set(name.lower() for name in wordnet.all_lemma_names(lang=lang)))
+    for name in tqdm(names, desc='Building the hyperonym table'):
+        synset = wordnet.synsets(name, None, lang, True)
+        if len(synset) == 0:
+            continue
+        score_list = []
+        for syn in synset:
+            if syn not in depths:
+                depths[syn] = syn.min_depth()
+            score_list.append(depths[syn])
+        rows.append((name, statistics.mean(score_list), statistics.mode(score_list),
+                     score_list[0], max(score_list), len(score_list)))
+    return pd.DataFrame(rows, columns=['lemma', 'mean', 'mode', 'first', 'max', 'n_synsets'])
+
+def load_hyper_table(path:str):
+    """
+    This fonction reads the hyperonym table at path (see hyper_table_path),
+    or builds and saves it if there is none for this wordnet version
+
+    return: the DataFrame of build_hyper_table
+    """
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    hyper_table = build_hyper_table()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    hyper_table.to_parquet(path, index=False)
+    print(f'Hyperonym table of {len(hyper_table)} lemmas saved to {path}')
+    return hyper_table
+
+def get_hyperval(lemma:str, hyper_table:dict = None):
     """
     This fonction takes a lemma (str), look if that lemma is in wordnet dictionnary, 
     if it is, it returns the word hyperonym depth to the root of the dict (int)
@@ -38,6 +118,8 @@ def get_hyperval(lemma:str):
     parametre
     ------------
     lemma: a lemma (str)
+    hyper_table: if given, a dict lemma -> mean depth (from load_hyper_table)
+    read instead of wordnet
     return: the lemma hyperonym value (int) or None
 
     exemple
@@ -47,6 +129,8 @@ def get_hyperval(lemma:str):
     >>> hyperval = get_hyperval('birgb')
     >>> expect : None
     """
+    if hyper_table is not None:
+        return hyper_table.get(lemma.lower())
     synset = wordnet.synsets(lemma, None, 'fra', True)
     hyperscore = None
     meanhyper = None
@@ -161,56 +245,312 @@ def get_freq(lemma:str,lex3_dic,dictionary_other):
     all_freq = [freq_film,freq_livre,freq_other]
     return all_freq
 
-def hdd(text):
-	#requires Counter import
-	def choose(n, k): #calculate binomial
-		"""
-		A fast way to calculate binomial coefficients by Andrew Dalke (contrib).
-		"""
-		if 0 <= k <= n:
-			ntok = 1
-			ktok = 1
-			for t in range(1, min(k, n - k) + 1): #this was changed to "range" from "xrange" for py3
-				ntok *= n
-				ktok *= t
-				n -= 1
-			return ntok // ktok
-		else:
-			return 0
-
-	def hyper(successes, sample_size, population_size, freq): #calculate hypergeometric distribution
-		#probability a word will occur at least once in a sample of a particular size
-		try:
-			prob_1 = 1.0 - (float((choose(freq, successes) * choose((population_size - freq),(sample_size - successes)))) / float(choose(population_size, sample_size)))
-			prob_1 = prob_1 * (1/sample_size)
-		except ZeroDivisionError:
-			prob_1 = 0
-			
-		return prob_1
-
-	prob_sum = 0.0
-	ntokens = len(text)
-	types_list = list(set(text))
-	frequency_dict = Counter(text)
-
-	for items in types_list:
-		prob = hyper(0,42,ntokens,frequency_dict[items]) #random sample is 42 items in length
-		prob_sum += prob
-
-	return prob_sum
-
-
-def annotating(data_path,token_path):
+def as_list(tokens):
+    """
+    This fonction takes the lemme or POS of one utterance
+    as read from the token file and return it as a list like object.
+    A .parquet token file already gives lists (no parsing at all),
+    a .csv one gives their text form, read with ast.literal_eval
+
+    parameter
+    ------------
+    tokens: a list, an array or the str of a list
+    return: the tokens (list or array)
+    """
+    if isinstance(tokens, str):
+        return ast.literal_eval(tokens)
+    return tokens
+
+feature_names = ['score_hyper', 'score_valance', 'score_imagea', 'phonetic', 'pattern',
+                 'n_syllable', 'freq_lem_film', 'freq_lem_livre']
+feature_version = 1 # to change when get_lemma_features changes
+
+def get_lemma_features(lemma:str,hyper_dic,valence_dic,imagea_dic,lex3_dic):
+    """
+    This fonction takes a lemma (str) and return all its lexical values,
+    they only depend on the lemma (not on the occurrence) so they are
+    computed once per lemma (see load_feature_cache).
+    The overheard frequency depends on the corpus and is added per run
+
+    parameter
+    ------------
+    lemma: a lemma (str)
+    return: a tuple of the values of feature_names
+    """
+    hyperscore = get_hyperval(lemma,hyper_dic)
+    valence, imageabilite = get_sem_val(lemma,valence_dic,imagea_dic)
+    phonetic, phono_pattern, n_syll = get_phonetic(lemma,lex3_dic)
+    film, livre, _ = get_freq(lemma,lex3_dic,{})
+    return (hyperscore, valence, imageabilite, phonetic, phono_pattern, n_syll, film, livre)
+
+def feature_signature(paths):
+    """
+    This fonction return a signature of the data files the lexical values come from
+    (name, size and modification time), the feature cache is dropped when it changes
+    """
+    signature = hashlib.sha1(str(feature_version).encode('utf-8'))
+    for path in paths:
+        stat = os.stat(path)
+        signature.update(f"{os.path.basename(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8'))
+    return signature.hexdigest()
+
+def load_feature_cache(cache_dir:str, signature:str):
+    """
+    This fonction reads the lemma -> values dict of the former runs,
+    an empty dict if there is none or if the data files changed
+    """
+    path = os.path.join(cache_dir, 'lemma_features.pkl')
+    if os.path.exists(path):
+        with open(path, 'rb') as cache_file:
+            saved = pickle.load(cache_file)
+        if saved['signature'] == signature:
+            return saved['features']
+    return {}
+
+def save_feature_cache(cache_dir:str, signature:str, features:dict):
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, 'lemma_features.pkl'), 'wb') as cache_file:
+        pickle.dump({'signature': signature, 'features': features}, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+def explode_tokens(df, lower=True):
+    """
+    This fonction takes the tokenised utterances (lemme and POS columns)
+    and return a long table with one line per token
+
+    lower: if False, the lemmas keep their case
+    return: a DataFrame with the row of the utterance in df (its position),
+    the lemma (lower case) and the POS of each token, in the text order
+    """
+    lemmas = [as_list(lemma_list) for lemma_list in df['lemme']]
+    pos = [as_list(pos_list) for pos_list in df['POS']]
+    lengths = np.fromiter(map(len, lemmas), dtype=np.int64, count=len(lemmas))
+
+    def flat(column): # one array of all the tokens of a column
+        return np.concatenate(column) if column else np.array([], dtype=object)
+    lemma = pd.Series(flat(lemmas), dtype=object).astype(str)
+    return pd.DataFrame({'row': np.repeat(np.arange(len(df)), lengths),
+                         'lemma': lemma.str.lower() if lower else lemma,
+                         'POS': pd.Series(flat(pos), dtype=object).astype(str)})
+
+def lemma_bags(df):
+    """
+    This fonction collates the lemmas of each individual case
+    (participant_id, transcript_id) in one pass : the tokens are grouped
+    with a stable sort on their case, then sliced
+
+    return: the keys of the cases (in the order of the groupby),
+    the bag of each case (an array of lemma ids, in the text order, without the X and cm)
+    and the lemma of each id
+    """
+    grouped = df.groupby(['participant_id', 'transcript_id'])
+    keys = list(grouped.groups.keys()) if len(df) else []
+    case_of_row = grouped.ngroup().to_numpy()
+
+    tokens = explode_tokens(df, lower=False)
+    tokens = tokens.loc[(tokens['POS'] != 'X') & (tokens['POS'] != 'cm')]
+    lemma_ids, vocab = pd.factorize(tokens['lemma'])
+    cases = case_of_row[tokens['row'].to_numpy()]
+    in_case = cases >= 0 # rows with a missing participant_id or transcript_id have no case
+
+    order = np.argsort(cases[in_case], kind='stable')
+    bounds = np.searchsorted(cases[in_case][order], np.arange(len(keys) + 1))
+    sorted_ids = lemma_ids[in_case][order]
+    bags = [sorted_ids[bounds[n]:bounds[n + 1]] for n in range(len(keys))]
+    return keys, bags, np.asarray(vocab)
+
+def overheard_counts(df_other, environment_of):
+    """
+    This fonction counts the nouns (POS starting with n) of the overheard speech
+    with one groupby over its exploded tokens, at 4 levels
+
+    parameter
+    ------------
+    df_other: the overheard utterances (every role but the children)
+    environment_of: the participant_id of the target child of each transcript_id
+    (a dict or a Series), the environment of a child being all its transcripts
+    return: a dict level -> (counts, n_token) for the levels 'global', 'corpus',
+    'transcript' and 'environment'. counts is a sparse count table : a Series of
+    the number of occurrence of each (key, lemma) seen, indexed by the key of the level
+    and the lemma (lemma only for global, in order of first appearance) and n_token
+    the number of tokens (not only the nouns) of each key of the level (an int for global)
+    """
+    tokens = explode_tokens(df_other)
+    rows = tokens['row'].to_numpy()
+    transcript_id = df_other['transcript_id'].to_numpy()
+    environment = pd.Series(transcript_id).map(environment_of).to_numpy()
+    tokens['corpus'] = df_other['corpus'].to_numpy()[rows]
+    tokens['transcript_id'] = transcript_id[rows]
+    tokens['environment'] = environment[rows]
+
+    # the only pass over the tokens: the nouns of each transcript
+    keys = ['corpus', 'transcript_id', 'environment']
+    is_noun = (tokens['POS'].str[:1] == 'n').to_numpy()
+    noun_counts = tokens.loc[is_noun].groupby(keys + ['lemma'], dropna=False, sort=False).size()
+    token_counts = tokens.groupby(keys, dropna=False, sort=False).size()
+
+    # the other levels are sums of the transcript counts
+    tables = {'global': (noun_counts.groupby(level='lemma', sort=False).sum(), len(tokens))}
+    for level, key in [('corpus', 'corpus'), ('transcript', 'transcript_id'), ('environment', 'environment')]:
+        tables[level] = (noun_counts.groupby(level=[key, 'lemma'], sort=False).sum(),
+                         token_counts.groupby(level=key, sort=False).sum())
+    return tables
+
+def overheard_counts_from_matrix(matrix, rows, environment_of):
+    """
+    This fonction gives the same tables as overheard_counts with sparse
+    reductions of the count matrix of the token file, without reading the tokens
+
+    parameter
+    ------------
+    matrix: the count_matrix.CountMatrix of the token file
+    rows: boolean mask of the rows of the overheard speech (see CountMatrix.role_mask)
+    environment_of: the participant_id of the target child of each transcript_id
+    """
+    nouns = matrix.pos_mask(lambda pos: pos[:1] == 'n')
+    tables = {'global': (matrix.count_table(rows, nouns, lower=True), int(matrix.token_totals(rows).sum()))}
+    levels = {'corpus': pd.Series(matrix.corpus, name='corpus'),
+              'transcript': pd.Series(matrix.transcript_ids, name='transcript_id')}
+    levels['environment'] = levels['transcript'].map(environment_of).rename('environment')
+    for level, by in levels.items():
+        tables[level] = (matrix.count_table(rows, nouns, by=by, lower=True), matrix.token_totals(rows, by=by))
+    return tables
+
+def per_million(counts, n_token):
+    """
+    This fonction takes a count table of overheard_counts and the
+    number of tokens of its level and return the frequency per million tokens
+    """
+    if counts.index.nlevels == 1:
+        return counts / n_token * 1000000
+    return counts / n_token.reindex(counts.index.droplevel('lemma')).to_numpy() * 1000000
+
+def overheard_levels_table(tables):
+    """
+    This fonction gathers the tables of overheard_counts in one long DataFrame
+
+    parameter
+    ------------
+    tables: the dict level -> (counts, n_token) of overheard_counts
+    return: a DataFrame with one line per (level, key, lemma), its number of occurrence
+    and its frequency per million tokens of the key (the key is empty for the global level)
+    """
+    frames = []
+    for level, (counts, n_token) in tables.items():
+        frame = pd.DataFrame({'count': counts.to_numpy(), 'per_million': per_million(counts, n_token).to_numpy()})
+        if counts.index.nlevels == 1:
+            frame.insert(0, 'key', None)
+            frame.insert(1, 'lemma', counts.index.to_numpy())
+        else:
+            frame.insert(0, 'key', counts.index.get_level_values(0).to_numpy())
+            frame.insert(1, 'lemma', counts.index.get_level_values('lemma').to_numpy())
+        frame.insert(0, 'level', level)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def annotate_occurrences(df, features_of, lex3_dic, dictionary_other, mlu_dict, diversity, occ_match,
+                         session_freq=None):
+    """
+    Annotation engine of the target child utterances : the tokens are exploded
+    in a long table, the nouns kept with one vectorised filter
+    (POS starting with n, but not neg and n:prop) and the lexical values
+    of their lemma joined from a table with one line per lemma
+
+    parameter
+    ------------
+    df: the target child utterances
+    features_of: a function giving the get_lemma_features of a lemma
+    mlu_dict: the mlu per (participant_id, transcript_id)
+    diversity: metric -> its value per (participant_id, transcript_id), one column each (HDD ...)
+    occ_match: the dict of the dico match counts, updated
+    session_freq: the frequency per million of each (transcript_id, lemma) in the overheard speech
+    of its transcript (see overheard_counts), for the freq_overheard_session column
+    return: the columns of the annotated nouns (a dict of lists),
+    the number of occurrence of the nouns of lexique382 (dict, in order of appearance)
+    and the number of tokens
+    """
+    tokens = explode_tokens(df)
+    n_child_token = len(tokens)
+    occ_match['nb_token'] += n_child_token
+
+    is_noun = (tokens['POS'].str[:1] == 'n') & (tokens['POS'] != 'neg') & (tokens['POS'] != 'n:prop')
+    nouns = tokens.loc[is_noun]
+    rows = nouns['row'].to_numpy()
+
+    # lexical values: one line per lemma, joined on the occurrences
+    lemmas = pd.unique(nouns['lemma'])
+    features = pd.DataFrame([features_of(lemme) for lemme in lemmas], index=lemmas,
+                            columns=feature_names, dtype=object)
+    noun_features = features.reindex(nouns['lemma'])
+
+    # values of the utterance of each noun
+    def utterance_values(column):
+        return np.array([str(value) for value in df[column].tolist()], dtype=object)
+    participant_id = utterance_values('participant_id')
+    transcript_id = utterance_values('transcript_id')
+    keys = {row: (float(participant_id[row]), float(transcript_id[row])) for row in pd.unique(rows)}
+    row_keys = [keys[row] for row in rows]
+
+    donne_final = {'id': utterance_values('id')[rows].tolist(),
+                   'participant_id': participant_id[rows].tolist(),
+                   'participant_name': utterance_values('participant_name')[rows].tolist(),
+                   'occurrence': utterance_values('utterance')[rows].tolist(),
+                   'lemma': nouns['lemma'].tolist(), 'POS': nouns['POS'].tolist()}
+    for column in ['score_hyper', 'score_valance', 'score_imagea', 'phonetic', 'pattern',
+                   'freq_lem_film', 'freq_lem_livre']:
+        donne_final[column] = noun_features[column].tolist()
+    donne_final['freq_overheard'] = [dictionary_other.get(lemme, 0) for lemme in donne_final['lemma']]
+    if session_freq is not None:
+        sessions = pd.MultiIndex.from_arrays([df['transcript_id'].to_numpy()[rows], nouns['lemma'].to_numpy()])
+        donne_final['freq_overheard_session'] = session_freq.reindex(sessions).fillna(0).tolist()
+    donne_final['mlu'] = [mlu_dict[key] for key in row_keys]
+    for metric, values in diversity.items():
+        donne_final[metric] = [values[key] for key in row_keys]
+    donne_final['age'] = np.asarray(df['age'].tolist(), dtype=object)[rows].tolist()
+
+    # the dico match and the noun dictionnary only count the nouns of lexique382
+    in_lex3 = nouns['lemma'].map(lambda lemme: lemme in lex3_dic).to_numpy(dtype=bool)
+    dictionary = dict(Counter(nouns['lemma'].to_numpy()[in_lex3].tolist()))
+    occ_match['nb_nom'] += int(in_lex3.sum())
+    occ_match['lex3'] += int(in_lex3.sum())
+    for lemme, nb in dictionary.items():
+        hyperscore, valence, imageabilite = features.loc[lemme, ['score_hyper', 'score_valance', 'score_imagea']]
+        if hyperscore != None:
+            occ_match['hyper'] += nb
+        if valence != None:
+            occ_match['valence'] += nb
+        if imageabilite != None:
+            occ_match['imagea'] += nb
+
+    return donne_final, dictionary, n_child_token
+
+def annotating(data_path,token_path,cache_dir=None,jobs=1,metrics=('HDD',),seed=0,matrix_path=None,
+               session_frequency=False,min_tokens=50):
     """
     Main annotation process
+
+    cache_dir: folder of the hyperonym table (default the annotation_cache folder next to the token file),
+    built the first time (see load_hyper_table), and of the lexical
+    values of the lemmas of the former runs (see load_feature_cache)
+    jobs: number of process used for the lexical diversity of the individual cases (None = one per CPU)
+    metrics: the lexical diversity metrics of the individual cases, one column each
+    (HDD, MTLD, vocd-D, MATTR, TTR, see lexical_diversity.metric_functions)
+    seed: seed of the random samples of vocd-D
+    min_tokens: the individual cases with less tokens get no lexical diversity (None)
+    matrix_path: the count_matrix.CountMatrix (.npz) of the token file, if given the overheard
+    frequencies and the HDD inputs are sparse reductions of it instead of counts of the tokens
+    session_frequency: if True, the annotation has a freq_overheard_session column, the frequency
+    of the noun in the overheard speech of its own transcript
+    return: the annotated nouns, the child and overheard dictionaries, the overheard
+    frequencies per level (global, corpus, transcript, environment, see overheard_levels_table)
+    and the param of the run
     """
 
     # ---------------------------------------------------------
     # Data management
     # ---------------------------------------------------------
 
-    #import the main corpus datafile
-    df = pd.read_csv(token_path, sep = ',', encoding='utf-8')
+    #import the main corpus datafile (.csv or .parquet)
+    df = ctm_saver.read_table(token_path, sep = ',', encoding='utf-8')
     print(df.columns)
     print(df)
     #create a list of all speaker_role
@@ -232,6 +572,17 @@ def annotating(data_path,token_path):
 
     df_other = df[df['role'].isin(other_role)]
 
+    # the target child of each transcript, whose environment is the overheard speech
+    environment_of = df.loc[df['role'] == 'Target_Child'].groupby('transcript_id')['participant_id'].first()
+
+    #the count matrix made with the token file (see count_matrix.CountMatrix.stamp)
+    matrix = None
+    if matrix_path is not None and os.path.exists(matrix_path):
+        matrix = CountMatrix.load(matrix_path)
+        if not matrix.matches(token_path):
+            print(f'The count matrix {matrix_path} is not the one of {token_path}, the tokens are counted again')
+            matrix = None
+
     #filter the data - keep target child
     filter = "df = df.loc[df['role'] == ('Target_Child')]"
     df = df.loc[df['role'] == ('Target_Child')]
@@ -266,6 +617,22 @@ def annotating(data_path,token_path):
     val_dic = list(map(list, zip(mot_phon, patern_phon, n_syll, freqfilms2, freqlivres)))
     lex3_dic =  { k:v for (k,v) in zip(mot_grapheme, val_dic)}
 
+    #import the wordnet hyperonym depth of every french lemma
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(token_path)), 'annotation_cache')
+    # the path is computed once, the OMW data being hashed for it (see omw_signature)
+    hyper_path = hyper_table_path(cache_dir)
+    hyper_table = load_hyper_table(hyper_path)
+    hyper_dic = dict(zip(hyper_table['lemma'], hyper_table['mean']))
+
+    #the lexical values of each lemma, computed once (and kept from the former runs)
+    signature = feature_signature([os.path.join(data_path, "data_fan_valence.csv"),
+                                   os.path.join(data_path, "data_semantiqc_imagea.csv"),
+                                   os.path.join(data_path, 'data_lexique382.tsv'),
+                                   hyper_path])
+    lemma_features = load_feature_cache(cache_dir, signature)
+    n_cached_features = len(lemma_features)
+
     ''' 
     canvas of the df DataFrame columns :
     df_structure : {'id','collection_id','transcript_id','corpus_name','utterance_order',
@@ -274,12 +641,6 @@ def annotating(data_path,token_path):
     '''
 
     occ_match = {'nb_token' : 0, 'nb_nom' : 0, 'lex3' : 0, 'nb_UNK' : 0, 'valence' : 0, 'imagea' : 0, 'hyper' : 0}
-    n_child_token = 0
-    n_other_token = 0
-    dictionary = {}
-    dictionary_other = {}
-
-    id_list,participant_ids,participant_names,sentence,tok,lemm,n_tok,POSTAGS,hyper,val,imag,phon,patterns,n_syllable,fq_livre,fq_film,fq_other,mlus,vocds,age = [],[],[],[],[],[],[],[],[],[],[],[],[],[],[],[],[],[],[],[]
 
     stopword = ['xxx','x', 'xx', 'www' , 'yyy' , 'zzz','-', 'qqq',
                 'a','b','c','d','e','f','g','h','i','j','k','l','m','n','o','p','q','r','s','t','u','v','w','x','y','z','ə','ɛ','ø']
@@ -295,30 +656,17 @@ def annotating(data_path,token_path):
     print('Calculating word frequency per million of overheard speech')
     print('----------------------------------------------------------')
 
-    n_other_token = 0
-    for index, row in tqdm(df_other.iloc[:].iterrows(),total=df_other.shape[0],desc='Overheard speech'):
-        uter = str(row['utterance'])
-        id = str(row['id'])
-        lemsents = ast.literal_eval(row['lemme'])
-        POSTAG = ast.literal_eval(row['POS'])
-        for idx, token in enumerate(lemsents): #iterate over all word in tokenized sentence
-            n_other_token += 1
-            lemme = str(lemsents[idx]).lower()
-            POS = str(POSTAG[idx])
-            ''' # filtering the stopword (codeword, onomatope and interjection)
-            if POS == 'NOUN' and (token not in lex3_dic): # check if noun is in lexique382
-                    #lemme = token
-                    #POS = 'UNK'
-            '''
-            # making a Noun dictionary_other and counting occurrence
-            if POS[0] == 'n': 
-                if lemme not in dictionary_other:
-                    dictionary_other[lemme] = 1
-                else:
-                    dictionary_other[lemme] += 1
+    # the nouns of the overheard speech counted at once, globally, per corpus, transcript and child environment
+    if matrix is not None:
+        overheard_tables = overheard_counts_from_matrix(matrix, matrix.role_mask(other_role), environment_of)
+    else:
+        overheard_tables = overheard_counts(df_other, environment_of)
+    other_counts, n_other_token = overheard_tables['global']
 
     # calculating per million frequency of the overheard speech
-    dictionary_other = {word: (nb / n_other_token) * 1000000 for word, nb in dictionary_other.items()}
+    dictionary_other = {word: (nb / n_other_token) * 1000000 for word, nb in zip(other_counts.index, other_counts.tolist())}
+    session_freq = per_million(*overheard_tables['transcript']) if session_frequency else None
+    overheard_levels = overheard_levels_table(overheard_tables)
 
 
     sorted_dictionary_other = dict(reversed(sorted(dictionary_other.items(), key=lambda item: item[1])))
@@ -328,124 +676,45 @@ def annotating(data_path,token_path):
     overheard_dico = pd.DataFrame(dico_other_final)
 
     print('---------------------------------------------------------')
-    print('Calculating mlu and VocD per participant')
+    print('Calculating mlu and lexical diversity per participant')
     print('---------------------------------------------------------')
 
     mlu_dict = df.groupby(['participant_id', 'transcript_id'])['n_token'].mean().to_dict()
     #print(mlu_dict)
     
-    vocd_dict = {}
-
-    individual_case = {}
-    for key in tqdm(mlu_dict.keys(),desc='Collating each individual case as bags of words '): # iterrate over individual case
-        subset = df[(df['participant_id'] == key[0]) & (df['transcript_id'] == key[1])]
-        transcript_lemma = subset['lemme'].tolist()
-        transcript_pos = subset['POS'].tolist()
-        individual_case[key] = []
-        for lemma_list, pos_list in zip(transcript_lemma,transcript_pos): # iterrate over each lemmatized individual case
-            lemma_list = ast.literal_eval(lemma_list)
-            pos_list = ast.literal_eval(pos_list)
-            for lemma,pos in zip(lemma_list,pos_list):
-                if pos != 'X' and pos != 'cm':
-                    individual_case[key].append(lemma) # collate each lemma in a list for each individual case
-
-    for key, value in tqdm(individual_case.items(),desc='Computing hdd for each individual case'):
-        #print(key)
-        #print(len(value))
-        if len(value) < 50:
-            vocd_dict[key] = None
-        else:
-            vocd = hdd(value)
-            vocd_dict[key] = vocd
-        
+    # one bag of lemmas per individual case, collated at once
+    if matrix is not None and set(metrics) <= {'HDD', 'TTR'}:
+        # these metrics only need the number of tokens of each lemma, read in the count matrix
+        child_rows = matrix.role_mask(['Target_Child'])
+        counts, _ = matrix.row_counts(child_rows, matrix.pos_mask(lambda pos: pos != 'X' and pos != 'cm'))
+        keys = list(zip(matrix.participant_ids[child_rows], matrix.transcript_ids[child_rows]))
+        bags = [np.repeat(np.arange(len(lemma_counts)), lemma_counts) for lemma_counts in counts]
+    else:
+        keys, bags, _ = lemma_bags(df)
+    diversity = diversity_of_bags(bags, metrics, jobs=jobs, min_tokens=min_tokens, seed=seed)
+    diversity = {metric: dict(zip(keys, values)) for metric, values in diversity.items()}
+
     print('---------------------------------------------------------')
     print('Annotating hyperonymy, valence, imageability, phonetic, pattern')
     print('counting the occurrence of each lemma in a dic')
     print('and counting the quantity of dico match (raw_lemme vs valence vs imagea vs hyper vs phon)')
     print('---------------------------------------------------------')
 
-    # making the main loop on target_child sentence
-
-    for index, row in tqdm(df.iloc[:].iterrows(),total=df.shape[0],desc='Main loop annotating word value'): 
-        uter = str(row['utterance'])
-        id = str(row['id'])
-        transcript_id = str(row['transcript_id'])
-        participant_id = str(row['participant_id'])
-        participant_name = str(row['participant_name'])
-        lemsents = ast.literal_eval(row['lemme'])
-        POSTAG = ast.literal_eval(row['POS'])
-        n_token = int(row['n_token'])
-        child_age = row['age']
-        mlu = mlu_dict[(float(participant_id), float(transcript_id))]
-        vocd = vocd_dict[(float(participant_id), float(transcript_id))]
-        for idx, lemme in enumerate(lemsents): #iterate over all word in tokenized sentence
-            n_child_token += 1
-            lemme = str(lemsents[idx]).lower()
-            POS = str(POSTAG[idx])
-            ''' # filtering the stopword (codeword, onomatopoeia and interjection)
-            if token in interstopword:
-                lemme = token
-                POS = 'INTJ'
-            if POS == 'NOUN' and (token not in lex3_dic): # check if noun is in lexique382
-                    #lemme = token
-                    #POS = 'UNK'
-            '''
-
-            # get all the values (with custom function) for each NOUN
-            if POS[0] == 'n' and POS != 'neg' and POS != 'n:prop':
-                hyperscore = get_hyperval(lemme)
-                sem_score = get_sem_val(lemme,valence_dic,imagea_dic)
-                valence = sem_score[0]
-                imageabilite = sem_score[1]
-                phone_val = get_phonetic(lemme,lex3_dic)
-                phonetic = phone_val[0]
-                phono_pattern = phone_val[1]
-                n_syll = phone_val[2]
-                freq_val = get_freq(lemme,lex3_dic,dictionary_other)
-                film = freq_val[0]
-                livre = freq_val[1]
-                other = freq_val[2]
-
-                id_list.append(id)
-                participant_ids.append(participant_id)
-                participant_names.append(participant_name)
-                sentence.append(uter)
-                tok.append(token)
-                lemm.append(lemme)
-                POSTAGS.append(POS)
-                n_tok.append(n_token)
-                hyper.append(hyperscore)
-                val.append(valence)
-                imag.append(imageabilite)
-                phon.append(phonetic)
-                patterns.append(phono_pattern)
-                n_syllable.append(n_syll)
-                fq_film.append(film)
-                fq_livre.append(livre)
-                fq_other.append(other)
-                mlus.append(mlu)
-                vocds.append(vocd)
-                age.append(child_age)
-            #calculate the matching score for Dict
-            occ_match['nb_token'] += 1 #count number of token
-            if POS[0] == 'n' and POS != 'neg' and POS != 'n:prop' and  (lemme in lex3_dic):
-                occ_match['nb_nom'] += 1
-                if hyperscore != None:
-                    occ_match['hyper'] += 1
-                if valence != None:
-                    occ_match['valence'] += 1
-                if imageabilite != None:
-                    occ_match['imagea'] += 1
-                if lemme in lex3_dic:
-                    occ_match['lex3'] += 1
-                else:
-                    occ_match['nb_UNK'] += 1
-            # making a Noun dictionnary and counting occurrence
-            if POS[0] == 'n' and POS != 'neg' and POS != 'n:prop' and  (lemme in lex3_dic): 
-                if lemme not in dictionary:
-                    dictionary[lemme] = 1
-                else:
-                    dictionary[lemme] += 1
+    # annotating every noun of the target_child sentence at once
+
+    def features_of(lemme):
+        if lemme not in lemma_features:
+            lemma_features[lemme] = get_lemma_features(lemme,hyper_dic,valence_dic,imagea_dic,lex3_dic)
+        return lemma_features[lemme]
+
+    donne_final, dictionary, n_child_token = annotate_occurrences(df, features_of, lex3_dic,
+                                                                  dictionary_other, mlu_dict, diversity, occ_match,
+                                                                  session_freq)
+
+    if len(lemma_features) != n_cached_features:
+        save_feature_cache(cache_dir, signature, lemma_features)
+    print(f'Lexical values : {len(lemma_features)} lemmas ({n_cached_features} from the cache)')
+
     # making Noun dict on a frequency over / million word
     dictionary = {lemme: (nb / n_child_token) * 1000000 for lemme, nb in dictionary.items()}
     # making the result into 2 Dict ready to be converted to Dataframe
@@ -456,14 +725,6 @@ def annotating(data_path,token_path):
 
     dico_final = {'Lemme' : nom, "Number of occurrence" : nb_occu}
 
-    donne_final = {'id': id_list, 'participant_id': participant_ids, 
-                   'participant_name': participant_names,
-                   'occurrence': sentence, 
-                   'lemma': lemm,'POS': POSTAGS,
-                    'score_hyper': hyper, 'score_valance': val, 'score_imagea': imag, 
-                    'phonetic': phon,'pattern': patterns, 'freq_lem_film' : fq_film, 'freq_lem_livre' : fq_livre, 'freq_overheard' : fq_other,'mlu' : mlus,'HDD' : vocds, 'age': age}
-
-
     #make resulting Dict to DataFrame
     data_dico_final = pd.DataFrame(dico_final)
     datafinal = pd.DataFrame(donne_final)
@@ -479,8 +740,7 @@ def annotating(data_path,token_path):
             type_match['fan'].append(noun)
         if noun in imagea_dic:
             type_match['semQc'].append(noun)
-        synset = wordnet.synsets(noun, None, 'fra', True)
-        if len(synset) != 0:
+        if noun.lower() in hyper_dic:
             type_match['wordnet'].append(noun)
 
     nb_type_match = {}
@@ -498,7 +758,7 @@ def annotating(data_path,token_path):
 
     param = 'Filter : ' + filter +'\n'+'Taille du vocabulaire : '+taille_voca+'\n'+str(occ_match)+'\n'+str(nb_type_match)+'\n'+'corpus : '+str(all_corpus)
 
-    return datafinal, data_dico_final, overheard_dico, param
+    return datafinal, data_dico_final, overheard_dico, overheard_levels, param
 
 # ---------------------------------------------------------
 # Param
@@ -512,7 +772,7 @@ if run_as_test == True:
     token_path = '/Users/zikfle/Documents/Maitrise-analyse/results/french_corpa_token1.csv'
     result_folder_location = '/Users/zikfle/Documents/Maitrise-analyse/results'
     data_folder_location = "/Users/zikfle/Documents/Maitrise-analyse/data"
-    datafinal, data_dico_final, overheard_dico, param = annotating(data_folder_location,token_path)
+    datafinal, data_dico_final, overheard_dico, overheard_levels, param = annotating(data_folder_location,token_path)
 
     if saving == True:
         print('---------------------------------------------------------')
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------
+# Author: Félix Thibaud
+# Created on: 2026-10-18
+# Description: Single pass lexer for CHAT (.cha) files
+# MIT License
+# ---------------------------------------------------------
+
+import io
+import os
+import time
+from collections import namedtuple
+import regex as re
+
+# kind of the lexed lines
+HEADER = '@'        # @Participants:, @ID:, @Begin ...
+SPEAKER = '*'       # *CHI:, *MOT: ...
+TIER = '%'          # %mor:, %gra:, %com: ...
+CONTINUATION = ''   # line starting with a tab, continuing the previous one
+OTHER = '?'         # any other line with a tab
+
+ChatLine = namedtuple('ChatLine', ['kind', 'tag', 'content'])
+LexedChat = namedtuple('LexedChat', ['headers', 'lines'])
+
+media_bullet = re.compile('\x15.*\x15')
+line_kinds = {'@': HEADER, '*': SPEAKER, '%': TIER}
+
+def lex_chat(lines, header_only=False):
+    '''
+    Splitting the lines of a .cha file into typed records in one pass
+
+    Parameters
+    ----------
+    lines : an iterable of the raw lines of a .cha file (with or without the line break)
+    header_only : if True, stop at the first utterance (enough for the metadata)
+
+    Returns
+    -------
+    LexedChat : 1- the header records only (for the metadata) and
+    2- every record in the file order. A record is a ChatLine(kind, tag, content),
+    the content has its media bullets (\\x15...\\x15) and line break removed.
+    A header without a tab (like @Begin) has a None content, any other
+    line without a tab is dropped.
+    '''
+    headers, records = [], []
+    for line in lines:
+        if header_only and line.startswith('*'):
+            break
+        tag, tab, content = line.partition('\t')
+        if not tab:
+            if tag.startswith('@'):
+                record = ChatLine(HEADER, tag.rstrip('\n'), None)
+                headers.append(record)
+                records.append(record)
+            continue
+        if content.endswith('\n'):
+            content = content[:-1]
+        if '\x15' in content:
+            content = media_bullet.sub('', content)
+        if tag:
+            kind = line_kinds.get(tag[0], OTHER)
+        else:
+            kind = CONTINUATION
+        record = ChatLine(kind, tag, content)
+        if kind == HEADER:
+            headers.append(record)
+        records.append(record)
+    return LexedChat(headers, records)
+
+def lex_chat_file(file_path, header_only=False):
+    '''
+    Reading and lexing one .cha file (see lex_chat)
+    '''
+    with open(file_path,'r',encoding = 'utf-8') as transcript:
+        return lex_chat(transcript, header_only)
+
+def lex_chat_archive(archive, member, header_only=False):
+    '''
+    Reading and lexing one .cha file of an opened zipfile.ZipFile,
+    decompressed on the fly in memory (see lex_chat)
+    '''
+    with archive.open(member) as raw:
+        return lex_chat(io.TextIOWrapper(raw, encoding = 'utf-8'), header_only)
+
+def _split_lines_legacy(file_path):
+    '''
+    The former reading loop of childes_parser.parse_chat_folder, kept for the benchmark
+    '''
+    transcript = open(file_path,'r',encoding = 'utf-8')
+    transcript_lines = transcript.readlines()
+    transcript.close()
+    transcript_as_list = []
+    for line in transcript_lines:
+        line = line.split('\t')
+        if len(line) == 2:
+            line[1] = re.sub('\x15.*\x15','',line[1])
+            line[1] = re.sub('\n','',line[1])
+        transcript_as_list.append(line)
+    return transcript_as_list
+
+def benchmark_lexer(data_path, repeat=3):
+    '''
+    Comparing the throughput of lex_chat_file with the former reading loop
+    on every .cha file of a folder (best time of repeat runs)
+
+    Returns
+    -------
+    dict : the time in seconds, lines/s and MB/s of each reader
+    '''
+    files = [os.path.join(data_path, f) for f in sorted(os.listdir(data_path)) if f.endswith('.cha')]
+    n_bytes = sum(os.path.getsize(f) for f in files)
+    n_lines = sum(len(_split_lines_legacy(f)) for f in files)
+
+    result = {}
+    for name, reader in [('legacy', _split_lines_legacy), ('lexer', lex_chat_file)]:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for file_path in files:
+                reader(file_path)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        result[name] = {'seconds': best, 'lines/s': n_lines / best, 'MB/s': n_bytes / best / 1e6}
+        print(f"{name:>7} : {best:.3f} s, {n_lines / best:,.0f} lines/s, {n_bytes / best / 1e6:.1f} MB/s")
+    print(f"speedup : x{result['legacy']['seconds'] / result['lexer']['seconds']:.2f} on {len(files)} files")
+    return result
+
+# ---------------------------------------------------------
+# Param
+# ---------------------------------------------------------
+
+run_benchmark = False
+
+if run_benchmark == True:
+    data_folder_location = "/Users/zikfle/Documents/Maitrise-analyse/data/French-Corpa"
+    benchmark_lexer(data_folder_location)
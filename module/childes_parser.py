@@ -7,10 +7,69 @@
 # ---------------------------------------------------------
 
 import os
-import regex as re
 from tqdm import tqdm
 import pandas as pd
-import statistics
+import hashlib
+import json
+import pickle
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import module.chat_lexer as lexer
+import module.tokenisation as tokenizer
+from module.gra_parser import align_gra, gra_columns
+
+class ParticipantRegistry:
+    '''
+    Registry of the participant_id of each participant (code + corpus, like 'CHI Champaud').
+
+    The id is a stable hash of the name (blake2b, between 1 and 10**9), so it does
+    not depend on the file order, on the number of jobs or on the other transcripts
+    of the folder. On a (rare) collision the next free id is taken.
+    With a registry_path, the ids are kept in a small json sidecar file and read
+    back at the next run, so an id given once never changes, even after a collision.
+    '''
+    registry_version = 1
+    id_space = 10**9
+
+    def __init__(self, registry_path=None):
+        self.registry_path = registry_path
+        self.ids = {}
+        self.changed = False
+        if registry_path and os.path.exists(registry_path):
+            with open(registry_path, 'r', encoding='utf-8') as registry_file:
+                saved = json.load(registry_file)
+            if saved.get('version') == self.registry_version:
+                self.ids = saved['participants']
+        self.used = set(self.ids.values())
+
+    @classmethod
+    def hash_id(cls, unique_name):
+        digest = hashlib.blake2b(unique_name.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') % cls.id_space + 1
+
+    def get_id(self, unique_name):
+        participant_id = self.ids.get(unique_name)
+        if participant_id is None:
+            participant_id = self.hash_id(unique_name)
+            while participant_id in self.used:
+                participant_id = participant_id % self.id_space + 1
+            self.ids[unique_name] = participant_id
+            self.used.add(participant_id)
+            self.changed = True
+        return participant_id
+
+    def save(self):
+        if not self.registry_path or not self.changed:
+            return
+        folder = os.path.dirname(self.registry_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(self.registry_path, 'w', encoding='utf-8') as registry_file:
+            json.dump({'version': self.registry_version, 'participants': self.ids},
+                      registry_file, ensure_ascii=False, indent=0, sort_keys=True)
+        self.changed = False
 
 def parse_metadata(transcript, filename, transcript_id, participant_ids):
     '''
@@ -19,27 +78,25 @@ def parse_metadata(transcript, filename, transcript_id, participant_ids):
     
     Parameters
     ----------
-    transcript : 
-    Parameter description
+    transcript : the lexed .cha file (see chat_lexer.lex_chat),
+    only its header records are read
+    participant_ids : the ParticipantRegistry giving the participant_id
     
     Returns
     -------
     dict : all the metadata content in a dict
-    dict : all the participant_id from the global parsing
+    ParticipantRegistry : the participant_ids registry
     '''
-    # collect all metadata lines
-    raw_metadata = [line for line in transcript if line and line[0].startswith('@')]
-    basic_line = ['@Begin\n','@End\n','@UTF8\n']
+    basic_line = ['@Begin','@End','@UTF8']
     participants, ids = [], []
 
-    for line in raw_metadata:
-        # Ensure the line has at least 2 elements
-        if len(line) < 2:
-            if line[0] not in basic_line:
+    for _, tag, content in transcript.headers:
+        # Ensure the line has a content
+        if content is None:
+            if tag not in basic_line:
                 print(f"⚠️ Skipping a line in {filename} metadata")
-                print('line :', line)
+                print('line :', tag)
             continue
-        tag, content = line[0], line[1]
         if tag == '@Participants:':
             participants = [p.strip() for p in content.split(',')]
         elif tag == '@ID:':
@@ -60,15 +117,11 @@ def parse_metadata(transcript, filename, transcript_id, participant_ids):
         # assign a unique overall corpus participant_id 
         unique_name = parts[-2] + ' ' + ids[idx][1]
         
-        if unique_name not in participant_ids:
-            count_id = len(participant_ids) + 1
-            participant_ids[unique_name] = count_id
-        
         meta['codeb'].append(parts[-2])
         meta['roleb'].append(parts[-1])
         meta['file_name'].append(filename)
         meta['transcript_id'].append(transcript_id)
-        meta['participant_id'].append(participant_ids[unique_name])
+        meta['participant_id'].append(participant_ids.get_id(unique_name))
         meta['participant_name'].append(unique_name)
 
         id_fields = ids[idx] + [''] * (10 - len(ids[idx]))  # pad if missing
@@ -89,77 +142,99 @@ def parse_metadata(transcript, filename, transcript_id, participant_ids):
 
 
 
-def age_to_days(age):
-    '''
-    Converting the CHILDES age fromat (like 1;02;10) to days
-    '''
-    days = None
-    if type(age) is str and age != '':
-        year_month_day = age.split(';')
-        year = int(year_month_day[0])
-        month_day = year_month_day[1]
-        if '.' in month_day:
-            month_day = month_day.split('.')
-            try:
-                month = int(month_day[0])
-            except:
-                month = 0
-            try:
-                day = int(month_day[1])
-            except:
-                day = 0
-        else: 
-            month = 0
-            day = 0
+age_pattern = r'^(?P<year>[^;.]*);(?P<month>[^;.]*)(?:\.(?P<day>[^;.]*))?'
+_age_cache = {}
+
+def ages_to_days(ages):
+    '''
+    Converting a whole Series of CHILDES ages (like 1;02.10) to days at once,
+    as year * 365 + month * 30.5 + day (NaN for a malformed year). Each distinct age string is parsed only once and
+    kept in a cache, so the ages repeated by the @ID of a participant
+    (or by many calls, as in iter_chat_folder) are not parsed again
+
+    Parameters
+    ----------
+    ages : a Series (or list) of ages as strings, NaN or '' for a missing age
+
+    Returns
+    -------
+    Series : the ages in days as float, NaN for a missing age
+    '''
+    ages = pd.Series(ages, dtype=object)
+    new = [age for age in pd.unique(ages) if isinstance(age, str) and age != '' and age not in _age_cache]
+    if new:
+        parts = pd.Series(new, dtype=object).str.extract(age_pattern)
+        year = pd.to_numeric(parts['year'], errors='coerce')
+        # the month and the day count only if a '.' follows the month
+        has_day = parts['day'].notna()
+        month = pd.to_numeric(parts['month'], errors='coerce').where(has_day).fillna(0)
+        day = pd.to_numeric(parts['day'], errors='coerce').fillna(0)
         days = (year * 365) + (month * 30.5) + day
-    #else:
-        #print('age : ',age)
-    return days
+        _age_cache.update(zip(new, days.tolist()))
+    return ages.map(_age_cache).astype(float)
 
-def parse_lines(transcript, metadata, transcript_name):
+utterance_columns = ['transcript_name', 'code', 'utterance', 'gra', 'mor', 'pho', 'act', 'com', 'sit']
+metadata_columns = ['codeb', 'roleb', 'file_name', 'transcript_id', 'participant_id', 'participant_name',
+                    'lang', 'corpus', 'code', 'age', 'sex', 'group', 'SES', 'role', 'education', 'custom']
+parsed_columns = utterance_columns + [c for c in metadata_columns if c != 'code'] + ['target_age', 'transcript_order']
+# added by the fused parse+tokenise mode, like tokenisation.parse_token
+token_columns = ['lemme', 'POS', 'flexions', 'n_token'] + gra_columns
+
+def parse_lines(transcript, transcript_name, tokenize=False):
     '''
-    Parsing each lines from a cha. file to dataframe
+    Parsing each lines from a cha. file to utterance columns
     
     Parameters
     ----------
-    transcript : a pre processed transcript version of a .cha file, 
-    line by line, and seperated in two part 1- the tag of the line and 
-    2- the content of the line
-    metadata : the metadata of that .cha file as a dict
+    transcript : the lexed .cha file (see chat_lexer.lex_chat),
+    each record has 1- the kind of the line, 2- the tag of the line and 
+    3- the content of the line
     transcript: the file name as a string
+    tokenize : if True, also split the %mor of each utterance as soon as it is
+    complete (see tokenisation.tokenize_chat) into the token_columns
 
     Returns
     -------
-    df : a dataframe where each line contains the line content and the metadata
-    associated with it's corresponding value
+    dict : one list per utterance column (see utterance_columns, and token_columns
+    if tokenize), the metadata are joined afterward for the whole corpus
+    (see normalise_tables and join_tables)
     '''
-    def get_target_age(meta):
-        if 'Target_Child' not in meta['role']:
-            return None
-        ages = [age_to_days(meta['age'][i]) for i, r in enumerate(meta['role']) if r == 'Target_Child' and meta['age'][i]]
-        return statistics.mean(ages) if ages else None
-
     # List and dict
-    data, current = [], {'utterance': '', 'gra': '', 'mor': '', 'pho': '', 'act': '', 'com': '', 'sit': ''}
-    code, oldtype, target_age = '', '*', get_target_age(metadata)
+    columns = {column: [] for column in utterance_columns + (token_columns if tokenize else [])}
+    current = {'utterance': '', 'gra': '', 'mor': '', 'pho': '', 'act': '', 'com': '', 'sit': ''}
+    code, oldtype = '', '*'
     tag_fields = {'%gra:','%mor:','%pho:','%act:','%com:','%sit:'}
-    id_line = 0
 
-    for type_tag, content in (l for l in transcript if len(l) == 2):
-        id_line += 1
+    def save_utterance():
+        columns['transcript_name'].append(transcript_name)
+        columns['code'].append(code)
+        for field, content in current.items():
+            columns[field].append(content)
+        if tokenize:
+            lemma, pos, flexion = tokenizer.tokenize_chat(current['mor'])
+            columns['lemme'].append(lemma)
+            columns['POS'].append(pos)
+            columns['flexions'].append(flexion)
+            columns['n_token'].append(len(lemma)-1)
+            for column, values in zip(gra_columns, align_gra(current['mor'], current['gra'])):
+                columns[column].append(values)
+
+    for kind, type_tag, content in transcript.lines:
+        if content is None:
+            continue
         # continuation line
-        if not type_tag:
+        if kind == lexer.CONTINUATION:
             if oldtype == '*': current['utterance'] += ' ' + content
             elif oldtype in tag_fields: current[oldtype[1:-1]] += ' ' + content
             continue
 
         # new speaker: save previous utterance
-        if type_tag.startswith('*') and current['utterance']:
-            data.append({'transcript_name': transcript_name, 'code': code, **current})
+        if kind == lexer.SPEAKER and current['utterance']:
+            save_utterance()
             current = {k: '' for k in current}
         
         # update current fields
-        if type_tag.startswith('*'):
+        if kind == lexer.SPEAKER:
             code = type_tag[1:-1]
             current['utterance'] = content
         elif type_tag in tag_fields:
@@ -168,97 +243,547 @@ def parse_lines(transcript, metadata, transcript_name):
 
     # save last utterance
     if current['utterance']:
-        data.append({'transcript_name': transcript_name, 'code': code, **current})
+        save_utterance()
 
-    # If no utterance found, return empty DataFrame
-    if not data:  # nothing parsed
+    if not columns['utterance']:  # nothing parsed
         print(f"⚠️ Skipping {transcript_name}: no speaker lines found.")
-        return pd.DataFrame(columns=[
-            'transcript_name', 'transcript_id', 'corpus', 'transcript_order',
-            'participant_id', 'code', 'role', 'age', 'target_age', 'utterance',
-            'mor', 'gra', 'pho', 'act', 'com', 'sit'
-        ])
-
-    # --- Merge metadata ---
-    df = pd.DataFrame(data)
-    meta_df = pd.DataFrame(metadata)
-    ''' # for debugging
-    if len(df) == 0:
-        print(transcript)
-        print("DEBUG:", transcript_name)
-        print("df columns:", df.columns.tolist())
-        print("meta_df columns:", meta_df.columns.tolist())
-        print("data length:", len(df))
-    '''
-    df = df.merge(meta_df, on='code', how='left')
-    df['target_age'] = target_age
-    df['transcript_order'] = range(1, len(df) + 1)
-    df['age'] = df['age'].apply(age_to_days)
-    ''' # --- For checking the result ---
-
-    for line in transcript:
-        print(line)
-    for utter in df['utterance']:
-        print(utter)
-    '''
-    return df
-
-def parse_chat_folder(data_path):
+    return columns
+
+def normalise_tables(utterances, metadata):
     '''
-    Parsing each .cha file in a given folder
+    Splitting the parsed utterances and metadata of one or many transcripts
+    into three tables, so the metadata are not repeated on every utterance
+
+    Parameters
+    ----------
+    utterances : a DataFrame of the utterance columns (see parse_lines)
+    and a 'transcript_key' column giving the transcript_id of each utterance
+    metadata : a DataFrame of the metadata of the same transcripts
+    (see parse_metadata), with their participant_id already given
+
+    Returns
+    -------
+    dict : 'transcripts' one line per transcript_id (transcript_name, target_age),
+    'participants' one line per transcript_id and speaker code, since the age
+    and role of a participant_id change from one session to the other,
+    'utterances' the tier contents with only transcript_id and code as keys
+    (and the token_columns if the utterances were tokenised)
+    '''
+    participants = metadata[['transcript_id', 'code', 'participant_id', 'participant_name', 'codeb', 'roleb',
+                             'lang', 'corpus', 'age', 'sex', 'group', 'SES', 'role', 'education', 'custom']].copy()
+    is_target = (participants['role'] == 'Target_Child') & (participants['age'] != '')
+    participants['age'] = ages_to_days(participants['age']).values
+    target_age = participants.loc[is_target].groupby('transcript_id')['age'].mean()
+
+    utterances = utterances.rename(columns={'transcript_key': 'transcript_id'})
+    transcripts = utterances[['transcript_id', 'transcript_name']].drop_duplicates('transcript_id')
+    transcripts = transcripts.reset_index(drop=True)
+    transcripts['target_age'] = transcripts['transcript_id'].map(target_age)
+
+    utterances = utterances.drop(columns='transcript_name')
+    utterances['transcript_order'] = utterances.groupby('transcript_id', sort=False).cumcount() + 1
+    utterances = utterances[['transcript_id', 'transcript_order'] + utterance_columns[1:]
+                            + [c for c in token_columns if c in utterances.columns]]
+
+    return {'transcripts': transcripts, 'participants': participants, 'utterances': utterances}
+
+def join_tables(tables, columns=None):
+    '''
+    Rebuilding the wide view of parse_chat_folder (one line per utterance
+    with all its metadata) from the tables of normalise_tables
+
+    Parameters
+    ----------
+    tables : the dict of normalise_tables (or parse_chat_folder(normalised=True))
+    columns : the columns wanted (default all of parsed_columns and
+    token_columns), only the needed metadata are joined
+
+    Returns
+    -------
+    df : the wide dataframe, with the same values and column order as parse_chat_folder
+    '''
+    if columns is None:
+        columns = parsed_columns + token_columns
+    keys = ['transcript_id', 'code']
+    participants = tables['participants']
+    participants = participants[keys + [c for c in participants.columns if c in columns and c not in keys]]
+    transcripts = tables['transcripts']
+    transcripts = transcripts[['transcript_id'] + [c for c in transcripts.columns if c != 'transcript_id' and (c in columns or c == 'transcript_name')]]
+
+    df = tables['utterances'].drop(columns='transcript_order').merge(participants, on=keys, how='left', indicator='matched')
+    df = df.merge(transcripts, on='transcript_id', how='left')
+    matched = df['matched'] == 'both'
+    # numbered after the join as the duplicated speaker codes give more lines
+    df['transcript_order'] = df.groupby('transcript_id', sort=False).cumcount() + 1
+    df['file_name'] = df['transcript_name'].where(matched)
+    if not matched.all():
+        df['transcript_id'] = df['transcript_id'].where(matched)
+    df.index.name = 'id'
+    return df[[c for c in parsed_columns + token_columns if c in columns and c in df.columns]]
+
+_open_archives = {}
+
+def _archive(zip_path):
+    '''
+    Opened zip archives, kept open for the life of the process so the
+    member index of a big archive is read only once per worker
+    '''
+    # a forked worker must not share the file offset of its parent's archives
+    archive = _open_archives.get((os.getpid(), zip_path))
+    if archive is None:
+        archive = _open_archives[(os.getpid(), zip_path)] = zipfile.ZipFile(zip_path)
+    return archive
+
+def _close_archives():
+    for (pid, zip_path), archive in list(_open_archives.items()):
+        if pid == os.getpid():
+            archive.close()
+        del _open_archives[(pid, zip_path)]
+
+def _source_size(source):
+    '''
+    Uncompressed size of a .cha file path or (zip_path, member) source
+    '''
+    if isinstance(source, tuple):
+        return _archive(source[0]).getinfo(source[1]).file_size
+    return os.path.getsize(source)
+
+def list_chat_files(data_path, recursive=False):
+    '''
+    Listing the .cha files of a folder or of a .zip archive
     
     Parameters
     ----------
-    data_path : the full folder data_path as a string
+    data_path : a folder or a .zip archive (as CHILDES distributes the corpora)
+    recursive : if True, also list the .cha files of the sub folders and
+    of the .zip archives found in the folder tree
 
     Returns
     -------
-    df : a dataframe containing all the lines and associated metadata of all
-    the .cha file present in the targeted folder
+    list : (source, transcript_name) sorted by transcript_name, a source is
+    a file path or a (zip_path, member) tuple. The transcript_name is the file
+    name for a flat folder and the path relative to data_path otherwise
     '''
-    print('-----------------------------------------------------------')
-    print(f'Reading all the cha. files in {data_path} and saving it into a Python Dict')
-    print('-----------------------------------------------------------')
-
-    transcript_save = {}
-
-    filelist = os.listdir(data_path)
-    filelist.sort()
-    print('Nb. of files : ',len(filelist))
-    for file in tqdm(filelist[:]):
-        if file.endswith(".cha"):
-            transcript = open(os.path.join(data_path,file),'r',encoding = 'utf-8')
-            transcript_lines = transcript.readlines()
-            transcript_as_list = []
-            for idx, line in enumerate(transcript_lines):
-                line = line.split('\t')
-                if len(line) == 2:
-                    line[1] = re.sub('\x15.*\x15','',line[1])
-                    line[1] = re.sub('\n','',line[1])
-                transcript_as_list.append(line)
-            transcript_save[file] = transcript_as_list
-
-    #print(transcript_save)
-
-    transcript_id = 0
-    participant_ids = {}
-    all_dfs = []
+    def archive_members(zip_path, prefix):
+        return [((zip_path, member), prefix + member) for member in _archive(zip_path).namelist()
+                if member.endswith('.cha') and not member.startswith('__MACOSX/')]
+
+    if os.path.isfile(data_path) and zipfile.is_zipfile(data_path):
+        sources = archive_members(data_path, '')
+    elif not recursive:
+        sources = [(os.path.join(data_path,file), file) for file in os.listdir(data_path) if file.endswith(".cha")]
+    else:
+        sources = []
+        for folder, subfolders, files in os.walk(data_path):
+            subfolders.sort()
+            for file in files:
+                file_path = os.path.join(folder, file)
+                relative = os.path.relpath(file_path, data_path).replace(os.sep, '/')
+                if file.endswith('.cha'):
+                    sources.append((file_path, relative))
+                elif file.endswith('.zip') and zipfile.is_zipfile(file_path):
+                    sources.extend(archive_members(file_path, relative + '/'))
+    sources.sort(key=lambda source: source[1])
+    return sources
+
+def _lex_source(source, header_only=False):
+    '''
+    Lexing a .cha file path or (zip_path, member) source
+    '''
+    if isinstance(source, tuple):
+        return lexer.lex_chat_archive(_archive(source[0]), source[1], header_only)
+    return lexer.lex_chat_file(source, header_only)
+
+def parse_chat_file(file_path, transcript_name, transcript_id, tokenize=False):
+    '''
+    Reading and parsing one .cha file, can be run in a worker process
+    
+    Parameters
+    ----------
+    file_path : the full path of the .cha file as a string,
+    or a (zip_path, member) tuple for a file in a .zip archive
+    transcript_name : the file name as a string
+    transcript_id : the id of the transcript in the folder
+    tokenize : if True, the %mor are also tokenised (see parse_lines)
+
+    Returns
+    -------
+    dict : the utterance columns of the transcript (see parse_lines)
+    dict : the metadata of the transcript (see parse_metadata),
+    the participant_id are checked afterward against the ParticipantRegistry
+    of the main process (for the collisions and the ids of the former runs)
+    '''
+    transcript = _lex_source(file_path)
+    metadata, _ = parse_metadata(transcript,transcript_name,transcript_id,ParticipantRegistry())
+    utterances = parse_lines(transcript,transcript_name,tokenize)
+    return utterances, metadata
+
+class ParseCache:
+    '''
+    On disk cache of the parse_chat_file results, one pickle per .cha file.
+
+    An index.json file keeps for each file its size, mtime and sha1 content hash.
+    A file is reparsed only if its size changed, or if its mtime changed and
+    its content hash too (a copy or a checkout only touches the mtime).
+    A member of a .zip archive is reparsed if its size or its CRC changed.
+    Bump cache_version when the parsing output changes to drop the old entries.
+    '''
+    cache_version = 5
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as index_file:
+                saved = json.load(index_file)
+            if saved.get('version') == self.cache_version:
+                self.index = saved['files']
+
+    def _pickle_path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+
+    @staticmethod
+    def _content_hash(file_path):
+        with open(file_path, 'rb') as chat_file:
+            return hashlib.sha1(chat_file.read()).hexdigest()
+
+    @staticmethod
+    def _key(source):
+        if isinstance(source, tuple):
+            return os.path.abspath(source[0]) + '::' + source[1]
+        return os.path.abspath(source)
+
+    def is_valid(self, file_path):
+        key = self._key(file_path)
+        entry = self.index.get(key)
+        if entry is None or not os.path.exists(self._pickle_path(key)):
+            return False
+        if isinstance(file_path, tuple):
+            info = _archive(file_path[0]).getinfo(file_path[1])
+            return info.file_size == entry['size'] and info.CRC == entry['crc']
+        stat = os.stat(file_path)
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns != entry['mtime_ns']:
+            if self._content_hash(file_path) != entry['sha1']:
+                return False
+            entry['mtime_ns'] = stat.st_mtime_ns
+        return True
+
+    def load(self, file_path, transcript_name, transcript_id):
+        with open(self._pickle_path(self._key(file_path)), 'rb') as pickle_file:
+            utterances, metadata = pickle.load(pickle_file)
+        # the transcript_id and the transcript_name (relative to the parsed folder)
+        # depend on the folder the file was parsed from
+        metadata['transcript_id'] = [transcript_id] * len(metadata['transcript_id'])
+        metadata['file_name'] = [transcript_name] * len(metadata['file_name'])
+        utterances['transcript_name'] = [transcript_name] * len(utterances['transcript_name'])
+        return utterances, metadata
+
+    def store(self, file_path, result):
+        key = self._key(file_path)
+        with open(self._pickle_path(key), 'wb') as pickle_file:
+            pickle.dump(result, pickle_file, protocol=pickle.HIGHEST_PROTOCOL)
+        if isinstance(file_path, tuple):
+            info = _archive(file_path[0]).getinfo(file_path[1])
+            self.index[key] = {'size': info.file_size, 'crc': info.CRC}
+            return
+        stat = os.stat(file_path)
+        self.index[key] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                           'sha1': self._content_hash(file_path)}
+
+    def save(self):
+        with open(self.index_path, 'w', encoding='utf-8') as index_file:
+            json.dump({'version': self.cache_version, 'files': self.index}, index_file)
+
+def _scan_tasks(tasks):
+    '''
+    Reading only the header of each (source, transcript_name, transcript_id) task
+    and returning the metadata of all their participants as one DataFrame
+    '''
+    metadata = {column: [] for column in metadata_columns}
+    for source, transcript_name, transcript_id in tqdm(tasks, desc='Scanning the headers'):
+        transcript = _lex_source(source, header_only=True)
+        meta, _ = parse_metadata(transcript,transcript_name,transcript_id,ParticipantRegistry())
+        for column in metadata_columns:
+            metadata[column].extend(meta[column])
+    index = pd.DataFrame(metadata).astype({'transcript_id': 'int64'})
+    index = index.drop(columns=['codeb', 'roleb', 'participant_id'])
+    index['age'] = ages_to_days(index['age']).values
+    return index
+
+def scan_chat_folder(data_path, recursive=False):
+    '''
+    Building an index of a corpus by reading only the @ header lines of each
+    .cha file (stopping at the first utterance), in seconds instead of a full parse
+    
+    Parameters
+    ----------
+    data_path : the full folder data_path as a string, or a .zip archive
+    recursive : see list_chat_files
+
+    Returns
+    -------
+    df : one line per participant of each transcript (transcript_id, file_name,
+    participant_name, corpus, code, role, age in days ...) with the same
+    transcript_id as parse_chat_folder
+    '''
+    sources = list_chat_files(data_path, recursive)
+    tasks = [(source, name, i + 1) for i, (source, name) in enumerate(sources)]
+    try:
+        return _scan_tasks(tasks)
+    finally:
+        _close_archives()
+
+def _filter_tasks(tasks, corpora=None, exclude_corpora=None, roles=None, min_age=None, max_age=None):
+    '''
+    Keeping only the tasks whose header match the filters (see parse_chat_folder),
+    so the excluded files are never fully parsed
+    '''
+    index = _scan_tasks(tasks)
+    keep = pd.Series(True, index=index.index)
+    if roles is not None:
+        keep &= index['role'].isin(roles)
+    if min_age is not None:
+        keep &= index['age'] >= min_age
+    if max_age is not None:
+        keep &= index['age'] <= max_age
+    kept = set(index.loc[keep, 'transcript_id'])
+    if corpora is not None:
+        kept &= set(index.loc[index['corpus'].isin(corpora), 'transcript_id'])
+    if exclude_corpora is not None:
+        kept -= set(index.loc[index['corpus'].isin(exclude_corpora), 'transcript_id'])
+    print(f'{len(kept)} of {len(tasks)} files kept by the filters')
+    return [task for task in tasks if task[2] in kept]
+
+def _iter_parsed_files(tasks, jobs, lookahead=None, cache=None, tokenize=False):
+    '''
+    Parsing a list of (source, transcript_name, transcript_id) tasks,
+    serially or with a process pool, and yielding the results in the task order.
+
+    With lookahead=None every file is submitted at once, the biggest first,
+    so that a few huge transcripts do not leave the other workers idle at the end.
+    With an int, only that many files are parsed ahead of the one being yielded,
+    which keeps the memory bounded when the results are streamed.
+    With a ParseCache, only the new or modified files are parsed.
+    With tokenize, the %mor are tokenised by the workers too (see parse_lines).
+    '''
+    hits = set()
+    if cache is not None:
+        hits = {i for i, task in enumerate(tasks) if cache.is_valid(task[0])}
+        print(f'{len(hits)} of {len(tasks)} files taken from the cache')
+
+    def resolve(i, future):
+        if i in hits:
+            return cache.load(*tasks[i])
+        result = future.result() if future is not None else parse_chat_file(*tasks[i], tokenize)
+        if cache is not None:
+            cache.store(tasks[i][0], result)
+        return result
+
+    try:
+        if jobs == 1 or len(tasks) - len(hits) < 2:
+            for i in tqdm(range(len(tasks))):
+                yield resolve(i, None)
+            return
+
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            if lookahead is None:
+                futures = {}
+                to_parse = [i for i in range(len(tasks)) if i not in hits]
+                by_size = sorted(to_parse, key=lambda i: _source_size(tasks[i][0]), reverse=True)
+                for i in by_size:
+                    futures[i] = executor.submit(parse_chat_file, *tasks[i], tokenize)
+                for i in tqdm(range(len(tasks))):
+                    # pop to release the result once yielded
+                    yield resolve(i, futures.pop(i, None))
+            else:
+                pending = deque()
+                for i in tqdm(range(len(tasks))):
+                    future = None if i in hits else executor.submit(parse_chat_file, *tasks[i], tokenize)
+                    pending.append((i, future))
+                    if len(pending) > lookahead:
+                        yield resolve(*pending.popleft())
+                while pending:
+                    yield resolve(*pending.popleft())
+    finally:
+        if cache is not None:
+            cache.save()
+
+def _batched(dfs, batch_size):
+    '''
+    Re-cutting a stream of DataFrames into DataFrames of batch_size rows
+    (the last one can be smaller)
+    '''
+    buffer, n_rows = [], 0
+    for df in dfs:
+        buffer.append(df)
+        n_rows += len(df)
+        if n_rows < batch_size:
+            continue
+        merged = pd.concat(buffer)
+        start = 0
+        while n_rows - start >= batch_size:
+            yield merged.iloc[start:start + batch_size]
+            start += batch_size
+        buffer, n_rows = [merged.iloc[start:]], n_rows - start
+    if n_rows:
+        yield pd.concat(buffer)
+
+def iter_chat_folder(data_path, jobs=1, batch_size=None, lookahead=None, cache_dir=None, recursive=False,
+                     corpora=None, exclude_corpora=None, roles=None, min_age=None, max_age=None,
+                     registry_path=None, tokenize=False):
+    '''
+    Parsing each .cha file in a given folder and yielding the result
+    one transcript at a time, so the whole corpus is never held in memory
+    
+    Parameters
+    ----------
+    batch_size : if given, yield DataFrames of batch_size utterance rows
+    instead of one DataFrame per transcript
+    lookahead : number of files parsed in advance by the process pool
+    (None = 4 per job, the files are then parsed in file order)
+    the other parameters are the ones of parse_chat_folder
+
+    Returns
+    -------
+    generator : DataFrames with the same columns as parse_chat_folder, 
+    their 'id' index continuing from one DataFrame to the next
+    '''
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if lookahead is None:
+        lookahead = 4 * jobs
+    filters = _filters(corpora, exclude_corpora, roles, min_age, max_age)
+
+    if batch_size:
+        yield from _batched(_iter_chat_folder(data_path, jobs, batch_size, lookahead, cache_dir, recursive=recursive,
+                                              filters=filters, registry_path=registry_path, tokenize=tokenize),
+                            batch_size)
+    else:
+        yield from _iter_chat_folder(data_path, jobs, 1, lookahead, cache_dir, recursive=recursive,
+                                     filters=filters, registry_path=registry_path, tokenize=tokenize)
+
+def _filters(corpora, exclude_corpora, roles, min_age, max_age):
+    filters = {'corpora': corpora, 'exclude_corpora': exclude_corpora, 'roles': roles,
+               'min_age': min_age, 'max_age': max_age}
+    return {name: value for name, value in filters.items() if value is not None}
+
+def _iter_chat_folder(data_path, jobs, chunk_rows, lookahead, cache_dir, normalised=False, recursive=False,
+                      filters=None, registry_path=None, tokenize=False):
+    '''
+    Parsing the .cha files of a folder and yielding the joined DataFrames
+    each time at least chunk_rows utterances are parsed (None = only once at the end),
+    or the dicts of normalise_tables if normalised
+    '''
+    sources = list_chat_files(data_path, recursive)
+    print('Nb. of files : ',len(sources))
+
+    # the transcript_id follow the sorted file order whatever the number of jobs
+    tasks = [(source, name, i + 1) for i, (source, name) in enumerate(sources)]
+    if filters:
+        tasks = _filter_tasks(tasks, **filters)
 
     print('---------------------------------------------------------')
-    print('Parsing each .cha file into a DataFrame')
+    print(f'Parsing each .cha file in {data_path} into a DataFrame ({jobs} job(s))')
     print('---------------------------------------------------------')
 
-    for transcript_name in tqdm(transcript_save.keys()):
-        transcript_id += 1
-        transcript = transcript_save[transcript_name]
-        metadata , participant_ids = parse_metadata(transcript,transcript_name,transcript_id,participant_ids)
-        parsed_transcript = parse_lines(transcript,metadata,transcript_name)
-        all_dfs.append(parsed_transcript)
+    if cache_dir and tokenize:
+        # the tokenised results are cached apart from the plain ones
+        cache_dir = os.path.join(cache_dir, 'tokenized')
+    cache = ParseCache(cache_dir) if cache_dir else None
+    participant_ids = ParticipantRegistry(registry_path)
+    n_rows = 0
+    parsed_utterance_columns = utterance_columns + (token_columns if tokenize else [])
+    utterances = {column: [] for column in parsed_utterance_columns + ['transcript_key']}
+    metadata = {column: [] for column in metadata_columns}
+
+    def join_pending():
+        # assign a unique overall corpus participant_id from the registry
+        metadata_df = pd.DataFrame(metadata).astype({'transcript_id': 'int64'})
+        metadata_df['participant_id'] = metadata_df['participant_name'].map(participant_ids.get_id).astype('int64')
+        tables = normalise_tables(pd.DataFrame(utterances), metadata_df)
+        for values in list(utterances.values()) + list(metadata.values()):
+            values.clear()
+        if normalised:
+            tables['utterances'].index = pd.RangeIndex(n_rows, n_rows + len(tables['utterances']), name='id')
+            return tables
+        df = join_tables(tables)
+        df.index = pd.RangeIndex(n_rows, n_rows + len(df), name='id')
+        return df
+
+    try:
+        for (columns, meta), task in zip(_iter_parsed_files(tasks, jobs, lookahead, cache, tokenize), tasks):
+            for column in metadata_columns:
+                metadata[column].extend(meta[column])
+            for column in parsed_utterance_columns:
+                utterances[column].extend(columns[column])
+            utterances['transcript_key'].extend([task[2]] * len(columns['utterance']))
+            if chunk_rows is not None and len(utterances['utterance']) >= chunk_rows:
+                df = join_pending()
+                n_rows += len(df['utterances'] if normalised else df)
+                yield df
+
+        if utterances['utterance']:
+            yield join_pending()
+    finally:
+        participant_ids.save()
+        _close_archives()
+
+def parse_chat_folder(data_path, jobs=1, cache_dir=None, normalised=False, recursive=False,
+                      corpora=None, exclude_corpora=None, roles=None, min_age=None, max_age=None,
+                      registry_path=None, tokenize=False):
+    '''
+    Parsing each .cha file in a given folder
+    
+    Parameters
+    ----------
+    data_path : the full folder data_path as a string, or a .zip archive
+    jobs : number of worker processes used to parse the files
+    (1 = no process pool, None = one per CPU)
+    cache_dir : if given, folder of the ParseCache, only the new or modified
+    files are parsed and the others are read from the cache
+    recursive : if True, also parse the sub folders and the .zip archives
+    of the folder tree (see list_chat_files)
+    corpora : if given, only parse the transcripts of these corpus
+    exclude_corpora : if given, never parse the transcripts of these corpus
+    roles : if given, only parse the transcripts with a participant of these roles
+    min_age, max_age : if given, only parse the transcripts with a participant
+    (of one of the roles, if given) of that age in days
+    The filters are checked on the @ header lines only (see scan_chat_folder)
+    and the transcript_id stay the ones of the unfiltered folder
+    registry_path : if given, json file of the ParticipantRegistry, the participant_id
+    given in the former runs are kept (the new participants are added to it)
+    tokenize : if True, the %mor are tokenised while parsing and the token_columns
+    (lemme, POS, flexions, n_token and the gra columns) added, as tokenisation.parse_token would
+    without the csv round trip (an empty %mor gives one empty lemma, not 'nan')
+    normalised : if True, return the transcripts, participants and utterances
+    tables of normalise_tables instead of one wide dataframe
+    (join_tables gives back the wide dataframe)
 
-    # keep only non-empty DataFrames
-    all_dfs = [df for df in all_dfs if not df.empty]
+    Returns
+    -------
+    df : a dataframe containing all the lines and associated metadata of all
+    the .cha file present in the targeted folder
+    '''
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    # one join of the utterances and metadata for the whole corpus
+    filters = _filters(corpora, exclude_corpora, roles, min_age, max_age)
+    all_dfs = list(_iter_chat_folder(data_path, jobs, None, None, cache_dir, normalised, recursive,
+                                     filters, registry_path, tokenize))
+    if normalised:
+        if all_dfs:
+            tables = all_dfs[0]
+            for name, table in tables.items():
+                print(f'{name} : {len(table)} lines')
+            return tables
+        return {'transcripts': pd.DataFrame(), 'participants': pd.DataFrame(), 'utterances': pd.DataFrame()}
     if all_dfs:
-        final_df = pd.concat(all_dfs, ignore_index=True)
+        final_df = all_dfs[0]
     else:
         final_df = pd.DataFrame()
     final_df.index.name = 'id'
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------
+# Author: Félix Thibaud
+# Created on: 2026-10-18
+# Description: Sparse count matrix (CSR like) of the lemmas of each transcript x participant
+# MIT License
+# ---------------------------------------------------------
+
+import os
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from module.token_store import TokenStore
+
+class CountMatrix:
+    '''
+    The number of tokens of each (lemma, POS) in each (transcript_id, participant_id, role)
+    of the tokenised corpus, as a sparse matrix in flat numpy arrays (no scipy)
+
+    The row i has its non zero counts between indptr[i] and indptr[i+1]:
+    indices holds their column and data their count, and first the position
+    of the first of these tokens in the whole token stream (the row order of
+    the token file), so the order of first appearance is kept by the reductions.
+    A row is described by transcript_ids[i], participant_ids[i], roles[i] and
+    corpus[i], a column j by lemma_vocab[j] and pos_vocab[j]. token_file holds the size
+    and mtime of the token file it was built from and token_sha1 its content hash (see stamp).
+
+    The counts (frequencies, HD-D inputs, vocabulary sizes) of any set of rows
+    and columns are then sparse reductions (see count_table, token_totals, row_counts).
+    '''
+    arrays = ['indptr', 'indices', 'data', 'first', 'transcript_ids', 'participant_ids',
+              'roles', 'corpus', 'lemma_vocab', 'pos_vocab', 'shape_info',
+              'token_file', 'token_sha1']
+
+    def __init__(self, indptr, indices, data, first, transcript_ids, participant_ids,
+                 roles, corpus, lemma_vocab, pos_vocab, shape_info,
+                 token_file=(0, 0), token_sha1=''):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.first = first
+        self.transcript_ids = transcript_ids
+        self.participant_ids = participant_ids
+        self.roles = roles
+        self.corpus = corpus
+        self.lemma_vocab = lemma_vocab
+        self.pos_vocab = pos_vocab
+        # (number of utterances, number of tokens) of the token file it was built from
+        self.shape_info = shape_info
+        self.token_file = np.asarray(token_file, dtype=np.int64)
+        self.token_sha1 = np.asarray(token_sha1, dtype=str)
+
+    @classmethod
+    def from_store(cls, store, df):
+        '''
+        Building the matrix from a TokenStore and the DataFrame it was built
+        from (for the transcript_id, participant_id, role and corpus of each utterance)
+        '''
+        keys = ['transcript_id', 'participant_id', 'role']
+        row_of_utterance = df.groupby(keys, dropna=False, sort=False).ngroup().to_numpy()
+        first_utterance = pd.Series(np.arange(len(df))).groupby(row_of_utterance, sort=True).first().to_numpy()
+
+        # columns: the (lemma, POS) pairs, in order of first appearance
+        pair = store.lemma_ids.astype(np.int64) * len(store.pos_vocab) + store.pos_ids
+        columns, pairs = pd.factorize(pair)
+        n_columns = max(len(pairs), 1)
+
+        # one entry per (row, column) seen, with its count and its first token
+        token_rows = row_of_utterance[store.token_rows()]
+        entries, first, data = np.unique(token_rows.astype(np.int64) * n_columns + columns,
+                                         return_index=True, return_counts=True)
+        rows = entries // n_columns
+        indptr = np.zeros(len(first_utterance) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(first_utterance)), out=indptr[1:])
+
+        def row_values(column, dtype):
+            return np.asarray(df[column].to_numpy()[first_utterance], dtype=dtype)
+        return cls(indptr, (entries % n_columns).astype(np.int32), data.astype(np.int32), first.astype(np.int64),
+                   row_values('transcript_id', np.float64), row_values('participant_id', np.float64),
+                   row_values('role', str), row_values('corpus', str),
+                   store.lemma_vocab[pairs // len(store.pos_vocab)], store.pos_vocab[pairs % len(store.pos_vocab)],
+                   np.array([len(store), store.n_tokens], dtype=np.int64))
+
+    @classmethod
+    def from_dataframe(cls, df):
+        '''
+        Building the matrix from a token DataFrame (lemme, POS, transcript_id,
+        participant_id, role and corpus columns)
+        '''
+        return cls.from_store(TokenStore.from_dataframe(df), df)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as saved:
+            # the matrices saved without token_file never match a token file
+            return cls(*(saved[name] for name in cls.arrays if name in saved.files))
+
+    def save(self, path):
+        '''
+        Saving every array in one compressed .npz file
+        '''
+        np.savez_compressed(path, **{name: getattr(self, name) for name in self.arrays})
+        return path
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def n_tokens(self):
+        return int(self.shape_info[1])
+
+    @staticmethod
+    def _content_hash(file_path):
+        sha1 = hashlib.sha1()
+        with open(file_path, 'rb') as token_file:
+            for block in iter(lambda: token_file.read(1 << 20), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    def stamp(self, token_path):
+        '''
+        Keeping the size, mtime and content hash of the token file the matrix
+        was built from (once it is written), for matches
+        '''
+        stat = os.stat(token_path)
+        self.token_file = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        self.token_sha1 = np.asarray(self._content_hash(token_path), dtype=str)
+        return self
+
+    def matches(self, token_path):
+        '''
+        True if the matrix was built from the token file at token_path (see stamp):
+        same size, and same mtime or else same content hash (as childes_parser.ParseCache,
+        a copy only touches the mtime)
+        '''
+        if not str(self.token_sha1) or not os.path.exists(token_path):
+            return False
+        stat = os.stat(token_path)
+        if stat.st_size != self.token_file[0]:
+            return False
+        return stat.st_mtime_ns == self.token_file[1] or self._content_hash(token_path) == str(self.token_sha1)
+
+    def role_mask(self, roles):
+        '''
+        Boolean mask of the rows of a speaker role among roles
+        '''
+        return np.isin(self.roles, list(roles))
+
+    def pos_mask(self, predicate):
+        '''
+        Boolean mask of the columns whose POS satisfies predicate,
+        e.g. pos_mask(lambda pos: pos[:1] == 'n') for the nouns
+        '''
+        return np.fromiter((bool(predicate(pos)) for pos in self.pos_vocab), dtype=bool, count=len(self.pos_vocab))
+
+    def _entries(self, rows=None, columns=None):
+        # the row, column, count and first token of the entries of the selected rows and columns
+        entry_rows = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+        keep = np.ones(len(self.indices), dtype=bool)
+        if rows is not None:
+            keep &= np.asarray(rows, dtype=bool)[entry_rows]
+        if columns is not None:
+            keep &= np.asarray(columns, dtype=bool)[self.indices]
+        return entry_rows[keep], self.indices[keep], self.data[keep], self.first[keep]
+
+    def _lemma_codes(self, lower):
+        # the lemma of each column as a code, the (lower case) lemmas merged
+        lemmas = pd.Series(self.lemma_vocab, dtype=object)
+        return pd.factorize(lemmas.str.lower() if lower else lemmas)
+
+    def count_table(self, rows=None, columns=None, by=None, lower=False):
+        '''
+        Counting the tokens of each lemma (the POS of a lemma added together)
+
+        Parameters
+        ----------
+        rows : a boolean mask over the rows (see role_mask), all the rows if None
+        columns : a boolean mask over the columns (see pos_mask), all the columns if None
+        by : a Series (or array) with a key for each row, to count each key apart
+        (the rows with a missing key are left out)
+        lower : if True, the lemmas differing only by their case are counted together
+
+        Returns
+        -------
+        Series : sparse count table, the number of tokens of each lemma (or each (key, lemma)) seen,
+        in order of first appearance in the token stream
+        '''
+        entry_rows, entry_columns, data, first = self._entries(rows, columns)
+        codes, lemmas = self._lemma_codes(lower)
+        entries = pd.DataFrame({'lemma': np.asarray(lemmas, dtype=object)[codes[entry_columns]],
+                                'count': data.astype(np.int64), 'first': first})
+        keys = ['lemma']
+        if by is not None:
+            name = getattr(by, 'name', None) or 'key'
+            entries.insert(0, name, np.asarray(by)[entry_rows])
+            keys = [name, 'lemma']
+        table = entries.groupby(keys, sort=False).agg(count=('count', 'sum'), first=('first', 'min'))
+        return table.sort_values('first', kind='stable')['count'].rename(None)
+
+    def token_totals(self, rows=None, columns=None, by=None):
+        '''
+        Number of tokens of each row (or each key of by, see count_table),
+        only the rows with tokens
+        '''
+        entry_rows, _, data, _ = self._entries(rows, columns)
+        totals = np.bincount(entry_rows, weights=data, minlength=len(self)).astype(np.int64)
+        if rows is None:
+            rows = np.ones(len(self), dtype=bool)
+        selected = np.asarray(rows, dtype=bool) & (totals > 0)
+        if by is None:
+            return totals[selected]
+        by = pd.Series(np.asarray(by), name=getattr(by, 'name', None) or 'key')
+        return pd.Series(totals[selected]).groupby(by[selected].reset_index(drop=True), sort=False).sum()
+
+    def row_counts(self, rows=None, columns=None, lower=False):
+        '''
+        The number of tokens of each lemma of each row (the inputs of
+        lexical_diversity.hdd_from_counts), and the lemma of these counts
+
+        Returns
+        -------
+        list : for each selected row, an array of the count of its lemmas
+        list : for each selected row, an array of its lemmas (same order)
+        '''
+        entry_rows, entry_columns, data, _ = self._entries(rows, columns)
+        codes, lemmas = self._lemma_codes(lower)
+        n_lemmas = max(len(lemmas), 1)
+        keys, inverse = np.unique(entry_rows * n_lemmas + codes[entry_columns], return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=data, minlength=len(keys)).astype(np.int64)
+        selected = np.flatnonzero(rows) if rows is not None else np.arange(len(self))
+        key_rows = keys // n_lemmas
+        starts = np.searchsorted(key_rows, selected, side='left')
+        ends = np.searchsorted(key_rows, selected, side='right')
+        lemma_of_key = np.asarray(lemmas, dtype=object)[keys % n_lemmas]
+        return ([counts[start:end] for start, end in zip(starts, ends)],
+                [lemma_of_key[start:end] for start, end in zip(starts, ends)])
+
+    def n_types(self, rows=None, columns=None, lower=False):
+        '''
+        The vocabulary size (number of distinct lemmas) of each selected row
+        '''
+        return np.array([len(counts) for counts in self.row_counts(rows, columns, lower)[0]], dtype=np.int64)
+
+# ---------------------------------------------------------
+# Param
+# ---------------------------------------------------------
+
+run_as_test = False
+
+if run_as_test == True:
+    matrix_path = '/Users/zikfle/Documents/Maitrise-analyse/results/french_corpa_count_matrix.npz'
+    matrix = CountMatrix.load(matrix_path)
+    print(len(matrix), 'transcript x participant,', matrix.n_tokens, 'tokens')
+    nouns = matrix.pos_mask(lambda pos: pos[:1] == 'n')
+    print(matrix.count_table(matrix.role_mask(['Target_Child']), nouns, lower=True).sort_values().tail(20))
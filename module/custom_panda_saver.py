@@ -1,6 +1,6 @@
 from pathlib import Path
 import sys
-from typing import Any
+from typing import Any, Iterable
 from datetime import datetime
 import shutil
 
@@ -10,37 +10,43 @@ def _is_dataframe_like(obj: Any) -> bool:
     return hasattr(obj, "to_csv") and callable(obj.to_csv)
 
 
-def safe_save(
-    dataframe: Any,
-    output_path: str,
-    file_name: str,
-    *,
-    sep: str = ",",
-    encoding: str = "utf-8",
-    mode: str = "w",
-    header: bool = True,
-    index: bool = False,
-    **kwargs,
-) -> Path | None:
+def _is_parquet(file_name: str) -> bool:
+    """Return True if the file is written / read as Parquet (by its suffix)."""
+    return Path(file_name).suffix.lower() == ".parquet"
+
+
+def read_table(path: str, *, sep: str = ",", encoding: str = "utf-8", **kwargs: Any):
     """
-    Write dataframe to a CSV file safely with optional backup.
+    Read a file written by safe_save / safe_save_chunks back to a DataFrame.
 
-    If the file already exists, the user is prompted to either:
-        - Overwrite it
-        - Backup the existing file before writing
-        - Cancel the operation
+    A ``.parquet`` file keeps its list columns (lemme, POS, flexions ...) as
+    real lists, so they never have to be parsed back from their text form.
+    Its saved index is given back as a column, like read_csv does with the
+    index column of a CSV file. Any other file is read as a CSV.
 
     Returns
     -------
-    Path | None
-        Path of the file that was written, or None if operation was aborted.
+    DataFrame
     """
+    import pandas as pd
 
-    # 1️⃣ Validate dataframe
-    if not _is_dataframe_like(dataframe):
-        raise TypeError(
-            "First argument must be a pandas DataFrame (or an object with `to_csv`)."
-        )
+    if _is_parquet(str(path)):
+        dataframe = pd.read_parquet(path, **kwargs)
+        if dataframe.index.name is not None:
+            dataframe = dataframe.reset_index()
+        return dataframe
+    return pd.read_csv(path, sep=sep, encoding=encoding, **kwargs)
+
+
+def _prepare_out_file(output_path: str, file_name: str) -> Path | None:
+    """
+    Create the output directory and ask the user what to do if the file exists.
+
+    Returns
+    -------
+    Path | None
+        Path of the file to write, or None if operation was aborted.
+    """
 
     # 2️⃣ Prepare output directory
     out_dir = Path(output_path).expanduser().resolve()
@@ -68,20 +74,136 @@ def safe_save(
             print("❌ Skipping save – operation cancelled.")
             return None
 
+    return out_file
+
+
+def safe_save(
+    dataframe: Any,
+    output_path: str,
+    file_name: str,
+    *,
+    sep: str = ",",
+    encoding: str = "utf-8",
+    mode: str = "w",
+    header: bool = True,
+    index: bool = False,
+    **kwargs,
+) -> Path | None:
+    """
+    Write dataframe to a CSV file safely with optional backup.
+    A file name ending with ``.parquet`` is written as Parquet instead
+    (sep, encoding, mode and header are then ignored).
+
+    If the file already exists, the user is prompted to either:
+        - Overwrite it
+        - Backup the existing file before writing
+        - Cancel the operation
+
+    Returns
+    -------
+    Path | None
+        Path of the file that was written, or None if operation was aborted.
+    """
+
+    # 1️⃣ Validate dataframe
+    if not _is_dataframe_like(dataframe):
+        raise TypeError(
+            "First argument must be a pandas DataFrame (or an object with `to_csv`)."
+        )
+
+    # 2️⃣ 3️⃣ Prepare output directory and handle existing file
+    out_file = _prepare_out_file(output_path, file_name)
+    if out_file is None:
+        return None
+
     # 4️⃣ Write the new file
     try:
-        dataframe.to_csv(
-            out_file,
-            sep=sep,
-            encoding=encoding,
-            mode=mode,
-            header=header,
-            index=index,
-            **kwargs,
-        )
+        if _is_parquet(file_name):
+            dataframe.to_parquet(out_file, index=index, **kwargs)
+        else:
+            dataframe.to_csv(
+                out_file,
+                sep=sep,
+                encoding=encoding,
+                mode=mode,
+                header=header,
+                index=index,
+                **kwargs,
+            )
+    except Exception as exc:
+        print(f"❌ Error while writing '{out_file}': {exc}", file=sys.stderr)
+        return None
+
+    print(f"✅ File written to: {out_file}")
+    return out_file
+
+
+def safe_save_chunks(
+    dataframes: Iterable[Any],
+    output_path: str,
+    file_name: str,
+    *,
+    sep: str = ",",
+    encoding: str = "utf-8",
+    header: bool = True,
+    index: bool = False,
+    **kwargs,
+) -> Path | None:
+    """
+    Write a stream of dataframes (e.g. from childes_parser.iter_chat_folder)
+    to one CSV file, one chunk at a time, so the whole data is never in memory.
+
+    The existing file is handled as in safe_save. The header is only
+    written with the first chunk. A file name ending with ``.parquet`` is
+    written as Parquet, one row group per chunk, with the column types
+    of the first chunk.
+
+    Returns
+    -------
+    Path | None
+        Path of the file that was written, or None if operation was aborted.
+    """
+
+    out_file = _prepare_out_file(output_path, file_name)
+    if out_file is None:
+        return None
+
+    writer = None
+    try:
+        first = True
+        for dataframe in dataframes:
+            if not _is_dataframe_like(dataframe):
+                raise TypeError(
+                    "Each chunk must be a pandas DataFrame (or an object with `to_csv`)."
+                )
+            if _is_parquet(file_name):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                schema = writer.schema if writer is not None else None
+                table = pa.Table.from_pandas(dataframe, schema=schema, preserve_index=index)
+                if writer is None:
+                    writer = pq.ParquetWriter(out_file, table.schema, **kwargs)
+                writer.write_table(table)
+            else:
+                dataframe.to_csv(
+                    out_file,
+                    sep=sep,
+                    encoding=encoding,
+                    mode="w" if first else "a",
+                    header=header and first,
+                    index=index,
+                    **kwargs,
+                )
+            first = False
+    except TypeError:
+        raise
     except Exception as exc:
         print(f"❌ Error while writing '{out_file}': {exc}", file=sys.stderr)
         return None
+    finally:
+        if writer is not None:
+            writer.close()
 
     print(f"✅ File written to: {out_file}")
     return out_file
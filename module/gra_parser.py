@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------
+# Author: Félix Thibaud
+# Created on: 2026-10-18
+# Description: Parser of the CLAN %gra dependency tier, aligned on the %mor tokens
+# MIT License
+# ---------------------------------------------------------
+
+from module.mor_parser import clitic_parts
+
+# columns added next to lemme, POS and flexions (see align_gra)
+gra_columns = ['gra_index', 'gra_head', 'gra_relation', 'gra_valid']
+
+# the gra_relation column holds an index in relation_vocab (the CHILDES GRASP relations),
+# fixed so the ids are the same in every worker, cache entry and token file.
+# 0 is no relation, 1 a relation not in the vocab (the raw gra column still has it)
+relation_vocab = ['', 'UNK',
+                  'SUBJ', 'CSUBJ', 'XSUBJ', 'ESUBJ', 'OBJ', 'OBJ2', 'IOBJ', 'COBJ', 'CPOBJ', 'POBJ',
+                  'PRED', 'CPRED', 'XPRED', 'COMP', 'XCOMP', 'JCT', 'CJCT', 'XJCT', 'NJCT',
+                  'MOD', 'CMOD', 'XMOD', 'PMOD', 'POSTMOD', 'AUX', 'NEG', 'DET', 'QUANT', 'POSS',
+                  'INF', 'LINK', 'PTL', 'CPZR', 'COM', 'TAG', 'SRL', 'APP', 'VOC', 'COORD', 'CONJ',
+                  'ENUM', 'ROOT', 'INCROOT', 'OM', 'TOPIC', 'DATE', 'NAME', 'LP', 'PUNCT',
+                  'BEGP', 'ENDP', 'QUOTE', 'BEG', 'END']
+relation_ids = {relation: n for n, relation in enumerate(relation_vocab)}
+
+def parse_gra(gra):
+    '''
+    Parsing a %gra tier like 1|2|SUBJ 2|0|ROOT 3|2|PUNCT
+
+    Parameters
+    ----------
+    gra : a raw %gra line as a string
+
+    Returns
+    -------
+    list : one (index, head, relation) per item, index and head as int
+    (head 0 is the root), or None if an item is malformed
+    '''
+    relations = []
+    for item in gra.split():
+        parts = item.split('|')
+        if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit():
+            return None
+        relations.append((int(parts[0]), int(parts[1]), parts[2]))
+    return relations
+
+def align_gra(morpho, gra):
+    '''
+    Aligning a %gra tier on the tokens of tokenisation.tokenize_chat, so each
+    lemma of an utterance gets its grammatical relation and head
+
+    The %gra items number the %mor items with their clitics split
+    (the tokens of mor_parser.parse_mor, counted with its mor_parser.clitic_parts).
+    A tokenize_chat token still holding a ~ clitic gets the relation of its first item.
+    The %gra is valid if it numbers exactly as many items as the %mor, in order.
+
+    Parameters
+    ----------
+    morpho : a raw %mor line as a string
+    gra : the raw %gra line of the same utterance
+
+    Returns
+    -------
+    list : the %gra index of each token (0 if none)
+    list : the head index of each token (-1 if none)
+    list : the relation of each token, as its index in relation_vocab (0 if none)
+    bool : True if the %gra is valid (all the tokens then have a relation)
+    '''
+    positions = []
+    n_items = 0
+    for grapheme in morpho.split(' '):
+        for pieces in clitic_parts(grapheme):
+            if pieces:
+                positions.append(n_items)
+                n_items += len(pieces)
+            else:
+                positions.append(-1)
+
+    relations = parse_gra(gra)
+    valid = (bool(relations) and len(relations) == n_items
+             and all(relation[0] == n for n, relation in enumerate(relations, 1)))
+    if not valid:
+        return [0] * len(positions), [-1] * len(positions), [0] * len(positions), False
+
+    index, head, relation = [], [], []
+    for position in positions:
+        if position < 0:
+            index.append(0)
+            head.append(-1)
+            relation.append(0)
+        else:
+            item = relations[position]
+            index.append(item[0])
+            head.append(item[1])
+            relation.append(relation_ids.get(item[2], 1))
+    return index, head, relation, True
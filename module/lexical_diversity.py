@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------
+# Author: Félix Thibaud
+# Created on: 2026-10-18
+# Description: Lexical diversity measures (HD-D, MTLD, vocd-D, MATTR, TTR) of the bags of lemmas
+# MIT License
+# ---------------------------------------------------------
+
+import math
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+from tqdm import tqdm
+
+# size of the random sample of HD-D (McCarthy & Jarvis 2007)
+hdd_sample_size = 42
+
+# number of distinct (ntokens, freq, sample_size) kept by the _p_absent cache
+absent_cache_size = 2**18
+
+@lru_cache(maxsize=absent_cache_size)
+def _p_absent(ntokens, freq, sample_size):
+    '''
+    Hypergeometric probability that a type of freq tokens, out of ntokens,
+    is absent from a random sample of sample_size tokens:
+    C(ntokens - freq, sample_size) / C(ntokens, sample_size)
+
+    Computed in log space as the sum of log(1 - freq / (ntokens - i)) for i < sample_size,
+    the big integer binomials are never built
+    '''
+    if ntokens - freq < sample_size:
+        return 0.0
+    return math.exp(math.fsum(math.log1p(-freq / (ntokens - i)) for i in range(sample_size)))
+
+def hdd_from_counts(counts, sample_size=hdd_sample_size):
+    '''
+    HD-D of a bag of words given the number of tokens of each of its types
+
+    The types of a same frequency have the same probability, so it is
+    computed once per frequency class (and cached for each (ntokens, freq))
+
+    Parameters
+    ----------
+    counts : the number of tokens of each type (an iterable of int, a Series ...)
+    sample_size : the size of the random sample
+
+    Returns
+    -------
+    float : the sum over the types of the probability to be in the sample,
+    divided by sample_size (0 if there are less tokens than sample_size)
+    '''
+    counts = np.asarray(counts, dtype=np.int64)
+    ntokens = int(counts.sum())
+    if ntokens < sample_size:
+        return 0.0
+    freqs, n_types = np.unique(counts, return_counts=True)
+    p_present = np.fromiter(((1.0 - _p_absent(ntokens, int(freq), sample_size)) / sample_size for freq in freqs),
+                            dtype=np.float64, count=len(freqs))
+    return float(np.dot(n_types, p_present))
+
+def hdd(text, sample_size=hdd_sample_size):
+    '''
+    HD-D of a list of tokens (see hdd_from_counts)
+    '''
+    return hdd_from_counts(list(Counter(text).values()), sample_size)
+
+def ttr(tokens):
+    '''
+    Type token ratio of a list of tokens
+    '''
+    return len(set(tokens)) / len(tokens) if len(tokens) else None
+
+def _mtld_pass(tokens, threshold):
+    # number of factors: a factor ends when the TTR of its tokens falls to the threshold,
+    # the last one counts for the part of the way it went
+    factors, types, n_token = 0.0, set(), 0
+    for token in tokens:
+        types.add(token)
+        n_token += 1
+        if len(types) / n_token <= threshold:
+            factors += 1
+            types, n_token = set(), 0
+    if n_token:
+        factors += (1 - len(types) / n_token) / (1 - threshold)
+    return factors
+
+def mtld(tokens, threshold=0.72):
+    '''
+    MTLD (McCarthy & Jarvis 2010): mean length of the sequences of tokens
+    keeping a TTR above threshold, the mean of a forward and a backward pass
+
+    Returns
+    -------
+    float : the MTLD, or None if no factor ends (every token is a new type)
+    '''
+    tokens = list(tokens)
+    lengths = []
+    for sequence in (tokens, tokens[::-1]):
+        factors = _mtld_pass(sequence, threshold)
+        if not factors:
+            return None
+        lengths.append(len(tokens) / factors)
+    return sum(lengths) / 2
+
+def mattr(tokens, window=50):
+    '''
+    Moving average TTR (Covington & McFall 2010): the mean TTR of every window
+    of window tokens (the TTR of the whole list if it is shorter)
+
+    A token is a new type in the windows starting after its previous occurrence,
+    so the types of all the windows are counted at once with a difference array
+    '''
+    ids = np.unique(np.asarray(tokens), return_inverse=True)[1].ravel()
+    n_token = len(ids)
+    if n_token <= window:
+        return ttr(ids.tolist())
+    n_window = n_token - window + 1
+
+    order = np.argsort(ids, kind='stable')
+    previous = np.full(n_token, -1, dtype=np.int64)
+    same = ids[order[1:]] == ids[order[:-1]]
+    previous[order[1:][same]] = order[:-1][same]
+
+    positions = np.arange(n_token)
+    first = np.maximum(previous + 1, positions - window + 1)
+    last = np.minimum(positions, n_window - 1)
+    counted = first <= last
+    changes = np.zeros(n_window + 1, dtype=np.int64)
+    np.add.at(changes, first[counted], 1)
+    np.add.at(changes, last[counted] + 1, -1)
+    n_types = np.cumsum(changes[:-1])
+    return float(n_types.mean() / window)
+
+def _vocd_curve(n_tokens, d):
+    # TTR expected for samples of n_tokens under the vocd model
+    return d / n_tokens * (np.sqrt(1 + 2 * n_tokens / d) - 1)
+
+def _fit_d(sizes, ttrs, low=1e-3, high=1e4, iterations=100):
+    '''
+    The D of the vocd curve closest to the TTR of each sample size (least squares),
+    a grid search refined by a golden section search
+    '''
+    def error(d):
+        return float(np.sum((ttrs - _vocd_curve(sizes, d)) ** 2))
+    grid = np.geomspace(low, high, 200)
+    best = int(np.argmin([error(d) for d in grid]))
+    a, b = grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)]
+    ratio = (math.sqrt(5) - 1) / 2
+    for _ in range(iterations):
+        c, d = b - ratio * (b - a), a + ratio * (b - a)
+        if error(c) < error(d):
+            b = d
+        else:
+            a = c
+    return (a + b) / 2
+
+def vocd_d(tokens, rng=None, sizes=range(35, 51), n_samples=100, n_trials=3):
+    '''
+    vocd-D (McKee, Malvern & Richards 2000): for each sample size, the mean TTR
+    of n_samples random samples of tokens (without replacement), fitted by
+    the D of the vocd curve, averaged over n_trials
+
+    Parameters
+    ----------
+    tokens : a list or array of tokens
+    rng : a numpy Generator (or a seed) for reproducible samples
+    sizes : the sample sizes
+
+    Returns
+    -------
+    float : the D, or None if there are less tokens than the largest sample
+    '''
+    rng = np.random.default_rng(rng)
+    counts = np.unique(np.asarray(tokens), return_counts=True)[1]
+    sizes = np.asarray(sizes, dtype=np.float64)
+    if counts.sum() < sizes.max():
+        return None
+    values = []
+    for _ in range(n_trials):
+        # a sample is drawn as the number of tokens of each type it holds
+        ttrs = []
+        for size in sizes:
+            samples = rng.multivariate_hypergeometric(counts, int(size), size=n_samples, method='count')
+            ttrs.append(np.count_nonzero(samples, axis=1).mean() / size)
+        values.append(_fit_d(sizes, np.array(ttrs)))
+    return float(np.mean(values))
+
+# the metrics of diversity_of_bags: name -> function(tokens, counts, rng), counts being
+# the number of tokens of each type. A new metric is added here (at import time,
+# so the worker processes know it)
+metric_functions = {
+    'HDD': lambda tokens, counts, rng: hdd_from_counts(counts),
+    'MTLD': lambda tokens, counts, rng: mtld(tokens),
+    'vocd-D': lambda tokens, counts, rng: vocd_d(tokens, rng),
+    'MATTR': lambda tokens, counts, rng: mattr(tokens),
+    'TTR': lambda tokens, counts, rng: len(counts) / counts.sum() if counts.sum() > 0 else None,
+}
+
+def _diversity_chunk(bags, first, metrics, min_tokens, seed):
+    '''
+    The metrics of each bag of a chunk (run in a worker of diversity_of_bags),
+    first being the number of the first bag of the chunk
+    '''
+    values = {metric: [] for metric in metrics}
+    for n, bag in enumerate(bags, first):
+        tokens = np.asarray(bag)
+        if len(tokens) < min_tokens:
+            for metric in metrics:
+                values[metric].append(None)
+            continue
+        counts = np.unique(tokens, return_counts=True)[1]
+        # one generator per bag, so the samples do not depend on the chunks or the jobs
+        rng = np.random.default_rng([seed, n])
+        for metric in metrics:
+            value = metric_functions[metric](tokens, counts, rng)
+            values[metric].append(None if value is None else float(value))
+    return values
+
+def diversity_of_bags(bags, metrics=('HDD',), jobs=1, min_tokens=50, seed=0, chunk_size=200):
+    '''
+    Computing a set of lexical diversity metrics in one pass over each bag
+    of words, serially or in chunks over a process pool
+
+    Parameters
+    ----------
+    bags : a list of bags, each a list or array of tokens (lemmas or lemma ids) in the text order
+    metrics : names of metric_functions (HDD, MTLD, vocd-D, MATTR, TTR)
+    jobs : number of worker processes (1 = no process pool, None = one per CPU)
+    min_tokens : the bags with less tokens get None for every metric
+    seed : seed of the random samples (vocd-D), the same seed gives the same values
+    chunk_size : number of bags sent to a worker at once
+
+    Returns
+    -------
+    dict : metric -> the value of each bag (or None), in the same order
+    '''
+    metrics = list(metrics)
+    unknown = [metric for metric in metrics if metric not in metric_functions]
+    if unknown:
+        raise ValueError(f'unknown lexical diversity metric {unknown}, available : {list(metric_functions)}')
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(bags) <= chunk_size:
+        return _diversity_chunk(bags, 0, metrics, min_tokens, seed)
+    starts = range(0, len(bags), chunk_size)
+    values = {metric: [] for metric in metrics}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_diversity_chunk, bags[start:start + chunk_size], start, metrics, min_tokens, seed)
+                   for start in starts]
+        for future in tqdm(futures, desc='Computing the lexical diversity of each individual case'):
+            for metric, chunk_values in future.result().items():
+                values[metric].extend(chunk_values)
+    return values
+
+def _hdd_legacy(text):
+	#requires Counter import
+	def choose(n, k): #calculate binomial
+		"""
+		A fast way to calculate binomial coefficients by Andrew Dalke (contrib).
+		"""
+		if 0 <= k <= n:
+			ntok = 1
+			ktok = 1
+			for t in range(1, min(k, n - k) + 1): #this was changed to "range" from "xrange" for py3
+				ntok *= n
+				ktok *= t
+				n -= 1
+			return ntok // ktok
+		else:
+			return 0
+
+	def hyper(successes, sample_size, population_size, freq): #calculate hypergeometric distribution
+		#probability a word will occur at least once in a sample of a particular size
+		try:
+			prob_1 = 1.0 - (float((choose(freq, successes) * choose((population_size - freq),(sample_size - successes)))) / float(choose(population_size, sample_size)))
+			prob_1 = prob_1 * (1/sample_size)
+		except ZeroDivisionError:
+			prob_1 = 0
+
+		return prob_1
+
+	prob_sum = 0.0
+	ntokens = len(text)
+	types_list = list(set(text))
+	frequency_dict = Counter(text)
+
+	for items in types_list:
+		prob = hyper(0,42,ntokens,frequency_dict[items]) #random sample is 42 items in length
+		prob_sum += prob
+
+	return prob_sum
+
+def synthetic_bags(n_bags=300, seed=0):
+    '''
+    Random bags of lemmas with a Zipf like distribution,
+    from a few tokens to long sessions
+    '''
+    rng = random.Random(seed)
+    vocab = [f'lemme{i}' for i in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocab))]
+    sizes = [rng.choice([10, 41, 42, 43, 50, 200, 1000, 5000, 20000]) for _ in range(n_bags)]
+    return [rng.choices(vocab, weights, k=size) for size in sizes]
+
+def benchmark_hdd(n_bags=300, seed=0, tolerance=1e-9):
+    '''
+    Comparing hdd with the former big integer version on synthetic bags:
+    the largest difference (must be under tolerance) and the time of each
+    '''
+    bags = synthetic_bags(n_bags, seed)
+    result = {}
+    for name, function in [('legacy', _hdd_legacy), ('hdd', hdd)]:
+        _p_absent.cache_clear()
+        start = time.perf_counter()
+        result[name] = [function(bag) for bag in bags]
+        elapsed = time.perf_counter() - start
+        print(f"{name:>6} : {elapsed:.3f} s")
+    max_diff = max(abs(a - b) for a, b in zip(result['legacy'], result['hdd']))
+    print(f"max difference : {max_diff:.2e} on {n_bags} bags")
+    if max_diff > tolerance:
+        raise ValueError(f'hdd differs from the former version by {max_diff:.2e}')
+    return max_diff
+
+# ---------------------------------------------------------
+# Param
+# ---------------------------------------------------------
+
+run_benchmark = False
+
+if run_benchmark == True:
+    benchmark_hdd()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------
+# Author: Félix Thibaud
+# Created on: 2026-10-18
+# Description: Single pass parser of the CLAN %mor tier into structured tokens
+# (the lemme/POS/flexions columns stay the ones of tokenisation.tokenize_chat,
+# this parser gives the structure of the items and their clitic parts for the %gra alignment)
+# MIT License
+# ---------------------------------------------------------
+
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+# clitic of a token
+HOST = ''       # the word itself
+PRE = 'pre'     # clitic before its host (pro:dem|ce$v|être, pro:subj|il~v|aller)
+POST = 'post'   # clitic after its host (v|aller~pro|y)
+
+# main POS of the clitics, the host of a clitic group is its first token of another POS
+clitic_pos = ('pro', 'det', 'neg')
+
+MorToken = namedtuple('MorToken', ['pos', 'subpos', 'stem', 'prefixes', 'fusions',
+                                   'suffixes', 'gloss', 'compound', 'clitic'])
+MorToken.__doc__ = '''
+One item of a %mor tier, like re#v:aux|faire&PRES-INF=do
+
+pos : the main part of speech ('v'), '' for a punctuation or a malformed item
+subpos : the sub categories after the ':' (('aux',))
+stem : the lemma ('faire'), the stems of the parts joined by '+' for a compound,
+the whole item for a punctuation
+prefixes : the prefixes marked with # (('re',))
+fusions : the fusional features marked with &, of the stem and of the suffixes (('PRES',))
+suffixes : the suffixes marked with -, without their & features (('INF',))
+gloss : the english gloss after = ('do'), '' if none
+compound : the MorToken of each part of a compound (n|+n|chou+n|fleur), () if none
+clitic : HOST, PRE or POST
+'''
+
+# number of distinct %mor items kept by the parse_mor_item cache (None = no limit)
+item_cache_size = 2**16
+
+def _parse_item(item, clitic=HOST):
+    '''
+    Parsing one %mor item without its clitics, with str methods only (no regex)
+    '''
+    head, bar, body = item.partition('|')
+    if not bar:
+        return MorToken('', (), item, (), (), (), '', (), clitic)
+
+    prefixes = head.split('#')
+    pos_parts = prefixes.pop().split(':')
+    pos = pos_parts[0]
+    subpos = tuple(pos_parts[1:])
+
+    if body.startswith('+'):
+        # compound: each part is a full item of its own
+        parts = tuple(_parse_item(part) for part in body[1:].split('+') if part)
+        last = parts[-1] if parts else None
+        return MorToken(pos, subpos, '+'.join(part.stem for part in parts), tuple(prefixes),
+                        last.fusions if last else (), last.suffixes if last else (),
+                        last.gloss if last else '', parts, clitic)
+
+    body, _, gloss = body.partition('=')
+    segments = body.split('-')
+    fusions = segments[0].split('&')
+    stem_parts = fusions[0].split('#')
+    stem = stem_parts.pop()
+    fusions = fusions[1:]
+    suffixes = []
+    for segment in segments[1:]:
+        # a suffix can carry & features too (v|dire-PP&m)
+        suffix, *features = segment.split('&')
+        suffixes.append(suffix)
+        fusions.extend(features)
+    return MorToken(pos, subpos, stem, tuple(prefixes + stem_parts), tuple(fusions),
+                    tuple(suffixes), gloss, (), clitic)
+
+def clitic_parts(item):
+    '''
+    Splitting one space separated %mor item into its $ parts (the tokens
+    of tokenisation.tokenize_chat), each one a list of its ~ pieces
+    (the %mor items numbered by the %gra tier), the empty pieces left out
+    '''
+    return [[piece for piece in part.split('~') if piece] for part in item.split('$')]
+
+@lru_cache(maxsize=item_cache_size)
+def parse_mor_item(item):
+    '''
+    Parsing one space separated item of a %mor tier, with its clitics
+
+    Parameters
+    ----------
+    item : one item as a string, like pro:dem|ce$v:exist|être&PRES&3s
+
+    Returns
+    -------
+    tuple : the MorToken of the host and of its clitics, in the text order
+    (the MorToken are immutable, so the results are cached)
+    '''
+    if '$' not in item and '~' not in item:
+        return (_parse_item(item),)
+    pieces = [piece for part in clitic_parts(item) for piece in part]
+    if not pieces:
+        return ()
+    # the host is the first piece that is not a clitic pronoun, determiner or negation
+    # (pro|y$pro|en~v|avoir : avoir), else the last piece before a ~ (pro|y$pro|en)
+    host = next((n for n, piece in enumerate(pieces)
+                 if piece.partition('|')[0].split('#')[-1].split(':')[0] not in clitic_pos), None)
+    if host is None:
+        before_tilde = item.split('~')[0]
+        host = max(len([piece for part in clitic_parts(before_tilde) for piece in part]) - 1, 0)
+    return tuple(_parse_item(piece, PRE if n < host else POST if n > host else HOST)
+                 for n, piece in enumerate(pieces))
+
+def parse_mor(morpho):
+    '''
+    Parsing a whole %mor tier into structured tokens in one pass
+
+    Parameters
+    ----------
+    morpho : a raw %mor line as a string
+
+    Returns
+    -------
+    list : one MorToken per word, clitic and punctuation, in the text order
+    (the same items as the %gra tier numbers)
+    '''
+    tokens = []
+    for item in morpho.split():
+        tokens.extend(parse_mor_item(item))
+    return tokens
+
+def _parse_mor_uncached(morpho):
+    '''
+    parse_mor without the parse_mor_item cache, for the benchmark
+    '''
+    tokens = []
+    for item in morpho.split():
+        tokens.extend(parse_mor_item.__wrapped__(item))
+    return tokens
+
+def benchmark_mor_parser(n_lines=200000, repeat=3):
+    '''
+    Comparing parse_mor, with and without its item cache, with tokenisation.tokenize_chat
+    as shipped (with its cache of whole %mor lines) and without its cache, on synthetic
+    %mor lines (best time of repeat runs, every cache emptied before each run)
+
+    Without cache parse_mor is only about 1.5-2 times faster than the split of tokenize_chat
+    (it builds a MorToken per item), and with their caches tokenize_chat is faster
+    (about x0.7 for parse_mor on 200,000 lines: a whole line is found at once in its cache)
+
+    Returns
+    -------
+    dict : the %mor lines/s of each parser
+    '''
+    import module.tokenisation as tokenizer
+    mors = tokenizer.synthetic_corpus(n_lines)['mor'].tolist()
+
+    result = {}
+    for name, parser in [('tokenize_chat', tokenizer.tokenize_chat),
+                         ('tokenize_chat (no cache)', tokenizer._split_mor),
+                         ('parse_mor (no cache)', _parse_mor_uncached), ('parse_mor', parse_mor)]:
+        best = None
+        for _ in range(repeat):
+            parse_mor_item.cache_clear()
+            tokenizer._tokenize_cached.cache_clear()
+            start = time.perf_counter()
+            for morpho in mors:
+                parser(morpho)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        result[name] = n_lines / best
+        print(f"{name:>24} : {best:.3f} s, {n_lines / best:,.0f} lines/s")
+    print(f"parse_mor (no cache) vs tokenize_chat (no cache) : x{result['parse_mor (no cache)'] / result['tokenize_chat (no cache)']:.2f}")
+    print(f"parse_mor vs tokenize_chat : x{result['parse_mor'] / result['tokenize_chat']:.2f} on {n_lines:,} lines")
+    return result
+
+# ---------------------------------------------------------
+# Param
+# ---------------------------------------------------------
+
+run_benchmark = False
+
+if run_benchmark == True:
+    benchmark_mor_parser()
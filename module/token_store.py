@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------
+# Author: Félix Thibaud
+# Created on: 2026-10-18
+# Description: Flat token store (CSR like offsets) of the tokenised corpus
+# MIT License
+# ---------------------------------------------------------
+
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from module.gra_parser import relation_vocab
+
+class TokenStore:
+    '''
+    All the tokens of the tokenised utterances (see tokenisation.parse_token)
+    in flat numpy arrays instead of one python list per utterance.
+
+    Each token has a lemma, POS and flexion id (lemma_ids, pos_ids, flexion_ids),
+    an index in lemma_vocab, pos_vocab and flexion_vocab. The tokens of the
+    utterance at row i are the ones between offsets[i] and offsets[i+1],
+    and utterance_ids[i] is the 'id' of that utterance in the token DataFrame.
+    So the per token work (filtering the nouns, counting ...) is done on
+    the whole corpus at once with array operations.
+
+    If the %gra was aligned (see gra_parser.align_gra), each token also has
+    its gra_index, gra_head and relation_ids (an index in relation_vocab),
+    and gra_valid tells for each utterance if its %gra was valid.
+    '''
+    arrays = ['lemma_ids', 'pos_ids', 'flexion_ids', 'offsets', 'utterance_ids',
+              'lemma_vocab', 'pos_vocab', 'flexion_vocab']
+    gra_arrays = ['gra_index', 'gra_head', 'relation_ids', 'relation_vocab', 'gra_valid']
+
+    def __init__(self, lemma_ids, pos_ids, flexion_ids, offsets, utterance_ids,
+                 lemma_vocab, pos_vocab, flexion_vocab, gra_index=None, gra_head=None,
+                 relation_ids=None, relation_vocab=None, gra_valid=None):
+        self.lemma_ids = lemma_ids
+        self.pos_ids = pos_ids
+        self.flexion_ids = flexion_ids
+        self.offsets = offsets
+        self.utterance_ids = utterance_ids
+        self.lemma_vocab = lemma_vocab
+        self.pos_vocab = pos_vocab
+        self.flexion_vocab = flexion_vocab
+        self.gra_index = gra_index
+        self.gra_head = gra_head
+        self.relation_ids = relation_ids
+        self.relation_vocab = relation_vocab
+        self.gra_valid = gra_valid
+
+    @property
+    def has_gra(self):
+        return self.relation_ids is not None
+
+    @staticmethod
+    def _flat(column, n_tokens):
+        tokens = list(chain.from_iterable(column))
+        if len(tokens) != n_tokens:
+            raise ValueError('every token column must have the same number of tokens per utterance')
+        return tokens
+
+    @classmethod
+    def from_lists(cls, lemmas, pos, flexions, utterance_ids=None, gra=None):
+        '''
+        Building the store from the lemme, POS and flexions of each utterance
+        (lists or arrays, as given by tokenisation.tokenize_chat), and if given
+        gra = (gra_index, gra_head, gra_relation, gra_valid) as given by gra_parser.align_gra
+        (the relations as ids in gra_parser.relation_vocab, or as strings)
+        '''
+        lengths = np.fromiter(map(len, lemmas), dtype=np.int64, count=len(lemmas))
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if utterance_ids is None:
+            utterance_ids = np.arange(len(lengths), dtype=np.int64)
+
+        encoded = []
+        for column in (lemmas, pos, flexions):
+            tokens = cls._flat(column, offsets[-1])
+            codes, vocab = pd.factorize(pd.Series(tokens, dtype=object).astype(str))
+            encoded.append((codes.astype(np.int32), np.asarray(vocab, dtype=str)))
+        (lemma_ids, lemma_vocab), (pos_ids, pos_vocab), (flexion_ids, flexion_vocab) = encoded[:3]
+        store = cls(lemma_ids, pos_ids, flexion_ids, offsets, np.asarray(utterance_ids),
+                    lemma_vocab, pos_vocab, flexion_vocab)
+        if gra is not None:
+            store.gra_index = np.asarray(cls._flat(gra[0], offsets[-1]), dtype=np.int32)
+            store.gra_head = np.asarray(cls._flat(gra[1], offsets[-1]), dtype=np.int32)
+            relations = cls._flat(gra[2], offsets[-1])
+            if relations and isinstance(relations[0], str):
+                codes, vocab = pd.factorize(pd.Series(relations, dtype=object))
+                store.relation_ids, store.relation_vocab = codes.astype(np.int32), np.asarray(vocab, dtype=str)
+            else:
+                store.relation_ids = np.asarray(relations, dtype=np.int32)
+                store.relation_vocab = np.asarray(relation_vocab, dtype=str)
+            store.gra_valid = np.asarray(gra[3], dtype=bool)
+        return store
+
+    @classmethod
+    def from_dataframe(cls, df):
+        '''
+        Building the store from a token DataFrame (lemme, POS, flexions columns),
+        its index giving the utterance_ids (and the gra columns if there)
+        '''
+        gra = None
+        if 'gra_relation' in df.columns:
+            gra = (df['gra_index'].tolist(), df['gra_head'].tolist(),
+                   df['gra_relation'].tolist(), df['gra_valid'].tolist())
+        return cls.from_lists(df['lemme'].tolist(), df['POS'].tolist(), df['flexions'].tolist(),
+                              df.index.to_numpy(), gra)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as saved:
+            gra = {name: saved[name] for name in cls.gra_arrays if name in saved.files}
+            return cls(*(saved[name] for name in cls.arrays), **gra)
+
+    def save(self, path):
+        '''
+        Saving every array in one compressed .npz file
+        '''
+        names = self.arrays + (self.gra_arrays if self.has_gra else [])
+        np.savez_compressed(path, **{name: getattr(self, name) for name in names})
+        return path
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def n_tokens(self):
+        return int(self.offsets[-1])
+
+    def token_rows(self):
+        '''
+        The utterance row (not id) of each token
+        '''
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    def utterance(self, row):
+        '''
+        The (lemmas, POS, flexions) lists of the utterance at a row
+        '''
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return (self.lemma_vocab[self.lemma_ids[start:end]].tolist(),
+                self.pos_vocab[self.pos_ids[start:end]].tolist(),
+                self.flexion_vocab[self.flexion_ids[start:end]].tolist())
+
+    def gra(self, row):
+        '''
+        The (gra_index, gra_head, relations) lists of the utterance at a row
+        '''
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return (self.gra_index[start:end].tolist(), self.gra_head[start:end].tolist(),
+                self.relation_vocab[self.relation_ids[start:end]].tolist())
+
+    @staticmethod
+    def _mask(vocab, ids, predicate):
+        # the predicate is called once per vocab entry, not once per token
+        in_vocab = np.fromiter((bool(predicate(value)) for value in vocab), dtype=bool, count=len(vocab))
+        return in_vocab[ids]
+
+    def pos_mask(self, predicate):
+        '''
+        Boolean mask of the tokens whose POS satisfies predicate,
+        e.g. pos_mask(lambda pos: pos[0] == 'n') for the nouns
+        '''
+        return self._mask(self.pos_vocab, self.pos_ids, predicate)
+
+    def lemma_mask(self, predicate):
+        '''
+        Boolean mask of the tokens whose lemma satisfies predicate
+        '''
+        return self._mask(self.lemma_vocab, self.lemma_ids, predicate)
+
+    def relation_mask(self, predicate):
+        '''
+        Boolean mask of the tokens whose %gra relation satisfies predicate,
+        e.g. relation_mask(lambda relation: relation == 'SUBJ')
+        '''
+        return self._mask(self.relation_vocab, self.relation_ids, predicate)
+
+    def rows_mask(self, rows_mask):
+        '''
+        Boolean mask of the tokens of the utterances selected by a per utterance mask
+        '''
+        return np.repeat(np.asarray(rows_mask, dtype=bool), np.diff(self.offsets))
+
+    def lemma_counts(self, mask=None, lower=False):
+        '''
+        Counting the tokens of each lemma (only the tokens of mask if given)
+
+        Parameters
+        ----------
+        mask : a boolean mask over the tokens (see pos_mask, lemma_mask, rows_mask)
+        lower : if True, the lemmas differing only by their case are counted together
+
+        Returns
+        -------
+        Series : lemma -> number of tokens, without the lemmas never counted
+        '''
+        lemma_ids = self.lemma_ids if mask is None else self.lemma_ids[mask]
+        counts = pd.Series(np.bincount(lemma_ids, minlength=len(self.lemma_vocab)), index=self.lemma_vocab)
+        if lower:
+            counts = counts.groupby(counts.index.str.lower(), sort=False).sum()
+        return counts[counts > 0]
+
+# ---------------------------------------------------------
+# Param
+# ---------------------------------------------------------
+
+run_as_test = False
+
+if run_as_test == True:
+    store_path = '/Users/zikfle/Documents/Maitrise-analyse/results/french_corpa_token_store.npz'
+    store = TokenStore.load(store_path)
+    print(len(store), 'utterances,', store.n_tokens, 'tokens')
+    print(store.lemma_counts(store.pos_mask(lambda pos: pos[0] == 'n'), lower=True).sort_values().tail(20))
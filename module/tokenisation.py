@@ -8,6 +8,9 @@
 
 ### Importing standard library
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 #import re
 #import pickle
 #import json 
@@ -15,6 +18,22 @@ from tqdm import tqdm
 import pandas as pd
 import regex as re
 
+import module.custom_panda_saver as ctm_saver
+from module.token_store import TokenStore
+from module.gra_parser import align_gra
+
+#all_corpus = ['Champaud' 'Geneva' 'GoadRose' 'Hammelrath' 'Hunkeler' 'Leveille' 'Lyon'
+# 'Palasis' 'Paris' 'StanfordFrench' 'VionColas' 'Yamaguchi' 'York']
+excluded_corpus = ['GoadRose', #pas de LAE + QC
+                   'Hammelrath', #story board
+                   'StanfordFrench', #pas de transcription
+                   'VionColas'] # story
+
+# number of distinct %mor kept by the tokenize_chat cache (None = no limit)
+mor_cache_size = 2**17
+# hits and misses of the cache, summed over the workers (see tokenize_column)
+mor_cache_stats = {'hits': 0, 'misses': 0}
+
 # ---------------------------------------------------------
 # Fonctions
 # ---------------------------------------------------------
@@ -32,6 +51,14 @@ def tokenize_chat(morpho):
     -------
     tree list : 1- a list of lemma, 2- a list of POS
     and 3- a list of morphological flexion
+    (new lists at each call, even when the %mor was already in the cache)
+    '''
+    lemma_sent, pos_sent, flex_sent = _tokenize_cached(morpho)
+    return [list(lemma_sent),list(pos_sent),list(flex_sent)]
+
+def _split_mor(morpho):
+    '''
+    The decomposition of tokenize_chat, as tuples so they can be shared by the cache
     '''
     list_grapheme2 = morpho.split(' ')
     lemma_sent = []
@@ -60,11 +87,102 @@ def tokenize_chat(morpho):
             pos_sent.append(pos)
             flex_sent.append(flexion)
 
-    return [lemma_sent,pos_sent,flex_sent]
+    return (tuple(lemma_sent),tuple(pos_sent),tuple(flex_sent))
+
+# child speech repeats the same %mor a lot, each distinct one is split once
+_tokenize_cached = lru_cache(maxsize=mor_cache_size)(_split_mor)
+
+def _tokenize_chunk(morphos, gras=None):
+    '''
+    Tokenising a list of %mor in a worker process (see tokenize_column),
+    and aligning the %gra of the same utterances if given
+
+    Returns
+    -------
+    list : the tokenize_chat result of each %mor (followed by its align_gra result if gras)
+    tuple : the cache hits and misses of this chunk
+    '''
+    before = _tokenize_cached.cache_info()
+    tokenized = [tokenize_chat(morpho) for morpho in morphos]
+    after = _tokenize_cached.cache_info()
+    if gras is not None:
+        tokenized = [tokens + list(align_gra(morpho, gra)) for tokens, morpho, gra in zip(tokenized, morphos, gras)]
+    return tokenized, (after.hits - before.hits, after.misses - before.misses)
+
+def _count_cache(stats):
+    mor_cache_stats['hits'] += stats[0]
+    mor_cache_stats['misses'] += stats[1]
+
+def reset_cache_stats():
+    mor_cache_stats['hits'] = 0
+    mor_cache_stats['misses'] = 0
+
+def report_cache_stats():
+    '''
+    Printing the hits and misses of the tokenize_chat cache since reset_cache_stats
+    '''
+    total = mor_cache_stats['hits'] + mor_cache_stats['misses']
+    rate = mor_cache_stats['hits'] / total if total else 0
+    print(f"%mor cache : {mor_cache_stats['hits']} hits, {mor_cache_stats['misses']} misses "
+          f"({rate:.1%} of the %mor already tokenised, cache size {mor_cache_size})")
+    return dict(mor_cache_stats)
+
+def tokenize_column(morphos, jobs=1, chunk_size=20000, gras=None):
+    '''
+    Tokenising a whole %mor column, serially or in chunks over a process pool
 
+    Parameters
+    ----------
+    morphos : a list (or Series) of raw %mor lines as strings
+    jobs : number of worker processes (1 = no process pool, None = one per CPU)
+    chunk_size : number of %mor sent to a worker at once
+    gras : the raw %gra line of each %mor, if given they are aligned
+    in the same chunks (see gra_parser.align_gra)
 
+    Returns
+    -------
+    tree list : 1- the lemma list, 2- the POS list and 3- the flexion list
+    of each %mor, in the same order (and if gras, the 4 lists of align_gra:
+    gra_index, gra_head, gra_relation and gra_valid)
+    '''
+    morphos = list(morphos)
+    if gras is not None:
+        gras = list(gras)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(morphos) <= chunk_size:
+        tokenized, stats = _tokenize_chunk(morphos, gras)
+        _count_cache(stats)
+    else:
+        starts = range(0, len(morphos), chunk_size)
+        chunks = [morphos[start:start + chunk_size] for start in starts]
+        gra_chunks = [gras[start:start + chunk_size] if gras is not None else None for start in starts]
+        tokenized = []
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for result, stats in tqdm(executor.map(_tokenize_chunk, chunks, gra_chunks), total=len(chunks)):
+                tokenized.extend(result)
+                _count_cache(stats)
+    n_columns = 7 if gras is not None else 3
+    return tuple([t[n] for t in tokenized] for n in range(n_columns))
 
-def parse_token(data_path: str):
+def add_token_columns(df, jobs=1):
+    '''
+    Adding the lemme, POS, flexions and n_token columns of the %mor column
+    to a Dataframe, in place (no second Dataframe merged back on the id),
+    and the gra_index, gra_head, gra_relation and gra_valid columns of the
+    %gra column aligned on the lemmas (see gra_parser.align_gra)
+    '''
+    morphos = df['mor'].astype(str).tolist()
+    gras = df['gra'].astype(str).tolist() if 'gra' in df.columns else None
+    # the %gra is aligned in the same chunks (and workers) as the %mor is tokenised
+    columns = tokenize_column(morphos, jobs, gras=gras)
+    df['lemme'], df['POS'], df['flexions'] = columns[:3]
+    df['n_token'] = [len(lemma)-1 for lemma in columns[0]]
+    if gras is not None:
+        df['gra_index'], df['gra_head'], df['gra_relation'], df['gra_valid'] = columns[3:]
+    return df
+
+def parse_token(data_path: str, store_path: str = None, jobs: int = 1):
     '''
     Take a Dataframe containing .cha transcription line,
     make tree new columns in that Dataframe (lemma, pos, flexion)
@@ -72,28 +190,27 @@ def parse_token(data_path: str):
 
     Parameters
     ----------
-    A Dataframe of .cha transcription lines
+    The path of a Dataframe of .cha transcription lines (.csv or .parquet)
+    store_path : if given, the tokens are also saved there as a
+    token_store.TokenStore (.npz) aligned on the 'id' of the result
+    jobs : number of worker processes tokenising the %mor column
+    (1 = no process pool, None = one per CPU)
 
     Returns
     -------
-    A Dataframa with tree added column
+    A Dataframa with tree added column (saving it as .parquet
+    keeps them as lists, see custom_panda_saver.read_table)
     '''
     print('---------------------------------------------------------')
     print(f'Reading the DataFrame form {data_path}')
     print('---------------------------------------------------------')
     #import the main corpus datafile
-    df = pd.read_csv(data_path, sep = ',', encoding='utf-8')
+    df = ctm_saver.read_table(data_path, sep = ',', encoding='utf-8')
     #df.index.name = 'id'
     #print(df.columns)
 
-    #all_corpus = ['Champaud' 'Geneva' 'GoadRose' 'Hammelrath' 'Hunkeler' 'Leveille' 'Lyon'
-    # 'Palasis' 'Paris' 'StanfordFrench' 'VionColas' 'Yamaguchi' 'York']
-
-    #filter 2 corpus out of the data
-    df = df.loc[df['corpus'] != ('GoadRose')] #pas de LAE + QC
-    df = df.loc[df['corpus'] != ('Hammelrath')] #story board
-    df = df.loc[df['corpus'] != ('StanfordFrench')] #pas de transcription
-    df = df.loc[df['corpus'] != ('VionColas')] # story
+    #filter some corpus out of the data
+    df = df.loc[~df['corpus'].isin(excluded_corpus)].copy()
 
 
     #print(df)
@@ -102,39 +219,117 @@ def parse_token(data_path: str):
     print('Getting the tokenisation from CLAN mor analysis')
     print('---------------------------------------------------------')
 
-    ids,lemsents,possents,flexions,n_tokens = [],[],[],[],[]
+    # the token columns are added to df itself, in the row order
+    reset_cache_stats()
+    datafinal = add_token_columns(df, jobs)
+    print('Nb of line in final data :', len(datafinal))
+
+    del datafinal['id']
+    datafinal.index = pd.RangeIndex(len(datafinal), name='id')
+    print(datafinal)
 
-    for index, row in tqdm(df.iloc[:].iterrows(),total=df.shape[0]):
-        id = row['id']
-        morpho = str(row['mor'])
-        uter = str(row['utterance'])
-        tokenized = tokenize_chat(morpho)
-        ids.append(id)
+    if store_path is not None:
+        store = TokenStore.from_dataframe(datafinal)
+        store.save(store_path)
+        print(f'Token store : {len(store)} utterances, {store.n_tokens} tokens saved to {store_path}')
+
+    report_cache_stats()
+    
+    return datafinal
+
+
+def iter_token(dataframes):
+    '''
+    Tokenising a stream of parsed DataFrames (e.g. from
+    childes_parser.iter_chat_folder) one DataFrame at a time,
+    with the same corpus filter and added columns as parse_token
+
+    Parameters
+    ----------
+    An iterable of Dataframes of .cha transcription lines
+
+    Returns
+    -------
+    A generator of Dataframes with tree added column (and n_token),
+    their 'id' index continuing from one DataFrame to the next.
+    An empty %mor gives one empty lemma (parse_token reads it back
+    from the csv as 'nan')
+    '''
+    n_rows = 0
+    for df in dataframes:
+        df = df.loc[~df['corpus'].isin(excluded_corpus)]
+        if df.empty:
+            continue
+        df = add_token_columns(df.copy())
+        df.index = pd.RangeIndex(n_rows, n_rows + len(df), name='id')
+        n_rows += len(df)
+        yield df
+
+def _parse_token_legacy(df):
+    '''
+    The former iterrows loop and merge of parse_token, kept for the benchmark
+    '''
+    ids,lemsents,possents,flexions,n_tokens = [],[],[],[],[]
+    for index, row in df.iterrows():
+        tokenized = tokenize_chat(str(row['mor']))
+        ids.append(row['id'])
         lemsents.append(tokenized[0])
         possents.append(tokenized[1])
         flexions.append(tokenized[2])
         n_tokens.append(len(tokenized[0])-1)
+    dataresult = pd.DataFrame({'id': ids, 'lemme': lemsents, 'POS': possents,
+                               'flexions' : flexions , 'n_token': n_tokens})
+    datafinal = pd.merge(df, dataresult, on="id")
+    del datafinal['id']
+    return datafinal
 
-    print('---------------------------------------------------------')
-    print('Merging result')
-    print('---------------------------------------------------------')
+def synthetic_corpus(n_utterances, seed=0):
+    '''
+    A Dataframe of n_utterances random %mor lines (with id, corpus and utterance
+    columns) looking like the French Corpa ones, for the benchmarks
+    '''
+    import random
+    rng = random.Random(seed)
+    nouns = ['maman', 'papa', 'chat', 'chien', 'soupe', 'gâteau', 'balle', 'livre', 'pomme', 'lait']
+    verbs = ['manger&PRES&3s', 'vouloir&PRES&1s', 'aller&PRES&3s', 'faire-INF', 'prendre&PP&m']
+    words = (['n|' + n for n in nouns] + ['n|' + n + '&f' for n in nouns] + ['v|' + v for v in verbs]
+             + ['det:art|le&m', 'det:art|la', 'pro:subj|je', 'adv|encore', 'co|oui', 'neg|pas',
+                'pro:dem|ce$v:exist|être&PRES&3s', 'pro:subj|il~v|aller&PRES&3s', 'n|+n|chou+n|fleur'])
+    mors = [' '.join(rng.choices(words, k=rng.randint(1, 9))) + rng.choice([' .', ' ?', ' !']) for _ in range(5000)]
+    mors.append('')
+    mor = [mors[rng.randrange(len(mors))] for _ in range(n_utterances)]
+    return pd.DataFrame({'id': range(n_utterances), 'corpus': 'Paris', 'utterance': 'x', 'mor': mor})
+
+def benchmark_tokenisation(n_utterances=2000000, jobs=None, legacy_rows=200000):
+    '''
+    Comparing the former iterrows + merge loop of parse_token with
+    add_token_columns (serial and with jobs processes) on a synthetic corpus.
+    The former loop only runs on the legacy_rows first utterances
+    (it would take minutes on millions), its time is given per utterance.
 
-    # putting the generated list in one dictionnary
-    df_final = {'id': ids, 'lemme': lemsents, 
-                'POS': possents, 'flexions' : flexions , 'n_token': n_tokens}
-    #'syllable': sylsents, 'nb_syllable': n_sylsents,
+    Returns
+    -------
+    dict : the utterances/s of each path
+    '''
+    df = synthetic_corpus(n_utterances)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
 
-    dataresult = pd.DataFrame(df_final) # putting the dictionnary into a Datafile
-    print('Nb of line in innital data :', len(df))
-    print('Nb of line in final data :', len(dataresult))
+    result = {}
+    legacy_df = df.iloc[:legacy_rows]
+    start = time.perf_counter()
+    _parse_token_legacy(legacy_df)
+    result['legacy'] = len(legacy_df) / (time.perf_counter() - start)
 
+    for name, n_jobs in [('column', 1), (f'column x{jobs}', jobs)]:
+        start = time.perf_counter()
+        add_token_columns(df.copy(), n_jobs)
+        result[name] = len(df) / (time.perf_counter() - start)
 
-    datafinal = pd.merge(df, dataresult, on="id") #merging the initial data and the result data
-    del datafinal['id']
-    datafinal.index.name = 'id'
-    print(datafinal)
-    
-    return datafinal
+    for name, speed in result.items():
+        print(f"{name:>12} : {speed:,.0f} utterances/s, x{speed / result['legacy']:.2f}")
+    print(f"on {n_utterances:,} synthetic utterances ({len(legacy_df):,} for legacy)")
+    return result
 
 
 # ---------------------------------------------------------
@@ -142,6 +337,7 @@ def parse_token(data_path: str):
 # ---------------------------------------------------------
 
 run_as_test = False
+run_benchmark = False
 saving = False
 save_name = 'french_corpa_token1.csv'
 
@@ -183,3 +379,6 @@ if run_as_test == True:
         print('---------------------------------------------------------')
         print('Saving set to false')
         print('---------------------------------------------------------')
+
+if run_benchmark == True:
+    benchmark_tokenisation()
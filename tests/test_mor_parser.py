@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# ---------------------------------------------------------
+# Author: Félix Thibaud
+# Created on: 2026-10-18
+# Description: Tests of the %mor parser on the token shapes of the French corpus
+# MIT License
+# ---------------------------------------------------------
+
+import pytest
+
+from module.mor_parser import HOST, PRE, POST, parse_mor, parse_mor_item, clitic_parts
+
+def shape(item):
+    return [(t.pos, t.subpos, t.stem, t.prefixes, t.fusions, t.suffixes, t.gloss, t.clitic)
+            for t in parse_mor_item(item)]
+
+cases = {
+    'n|chat': [('n', (), 'chat', (), (), (), '', HOST)],
+    'v:aux|avoir&PRES&3s': [('v', ('aux',), 'avoir', (), ('PRES', '3s'), (), '', HOST)],
+    'v|dire-PP&m': [('v', (), 'dire', (), ('m',), ('PP',), '', HOST)],
+    'adj|petit&f-PL': [('adj', (), 'petit', (), ('f',), ('PL',), '', HOST)],
+    'n|chat-PL=cats': [('n', (), 'chat', (), (), ('PL',), 'cats', HOST)],
+    're#v|faire-INF': [('v', (), 'faire', ('re',), (), ('INF',), '', HOST)],
+    'det:art|le&m': [('det', ('art',), 'le', (), ('m',), (), '', HOST)],
+    '.': [('', (), '.', (), (), (), '', HOST)],
+    'pro:dem|ce$v:exist|être&PRES&3s': [('pro', ('dem',), 'ce', (), (), (), '', PRE),
+                                       ('v', ('exist',), 'être', (), ('PRES', '3s'), (), '', HOST)],
+    'v|aller&PRES&3s~pro|y': [('v', (), 'aller', (), ('PRES', '3s'), (), '', HOST),
+                              ('pro', (), 'y', (), (), (), '', POST)],
+    'pro:subj|il~v|aller&PRES&3s': [('pro', ('subj',), 'il', (), (), (), '', PRE),
+                                    ('v', (), 'aller', (), ('PRES', '3s'), (), '', HOST)],
+    'pro|y$pro|en~v|avoir': [('pro', (), 'y', (), (), (), '', PRE), ('pro', (), 'en', (), (), (), '', PRE),
+                             ('v', (), 'avoir', (), (), (), '', HOST)],
+    'pro|y$pro|en': [('pro', (), 'y', (), (), (), '', PRE), ('pro', (), 'en', (), (), (), '', HOST)],
+}
+
+@pytest.mark.parametrize('item', list(cases))
+def test_item_shape(item):
+    assert shape(item) == cases[item]
+
+def test_compound():
+    compound = parse_mor_item('n|+n|chou+n|fleur')[0]
+    assert (compound.pos, compound.stem, len(compound.compound)) == ('n', 'chou+fleur', 2)
+    assert [part.stem for part in compound.compound] == ['chou', 'fleur']
+
+def test_tier_order():
+    # one token per %gra item, in the text order
+    tokens = parse_mor('pro:dem|ce$v:exist|être&PRES&3s pro:int|quoi pro:dem|ça ?')
+    assert [t.stem for t in tokens] == ['ce', 'être', 'quoi', 'ça', '?']
+    assert parse_mor('') == []
+
+def test_clitic_parts():
+    assert clitic_parts('pro|y$pro|en~v|avoir') == [['pro|y'], ['pro|en', 'v|avoir']]
+    assert clitic_parts('n|chat') == [['n|chat']]